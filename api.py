@@ -0,0 +1,138 @@
+import base64
+import json
+from flask import Blueprint, request, jsonify, current_app, abort
+from sqlalchemy import tuple_
+from models import db, Venue, Artist, Show, Recommendation
+from exports import serialize
+
+#----------------------------------------------------------------------------#
+# JSON API, version 1.
+#
+# Lists are paged by keyset: rows are ordered by (created_at, id) for venues
+# and artists and (start_time, id) for shows, and the opaque cursor of a page
+# carries the key of its last row. The next page starts with an index range
+# seek past that key, so deep pages cost the same as the first one.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+RESOURCES = {
+    'venues': (Venue, 'created_at'),
+    'artists': (Artist, 'created_at'),
+    'shows': (Show, 'start_time'),
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+@api.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify(error=str(error)), 400
+
+
+def encode_cursor(key, id):
+    raw = json.dumps([serialize(key), id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    import dateutil.parser
+    try:
+        key, id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return dateutil.parser.parse(key), int(id)
+    except (ValueError, TypeError, OverflowError):
+        raise BadRequest('invalid cursor')
+
+
+def selected_fields(Model):
+    # ?fields=id,name picks columns, all of them by default
+    names = [c.name for c in Model.__table__.columns]
+    fields = request.args.get('fields')
+    if not fields:
+        return names
+    fields = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in names]
+    if unknown:
+        raise BadRequest('unknown fields: ' + ', '.join(unknown))
+    return fields
+
+
+def page(Model, key_name, filters=()):
+    key = getattr(Model, key_name)
+    fields = selected_fields(Model)
+    limit = min(request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int),
+                current_app.config['API_MAX_PAGE_SIZE'])
+    if limit < 1:
+        raise BadRequest('limit must be positive')
+
+    query = db.session.query(key, Model.id, *[getattr(Model, f) for f in fields]) \
+        .filter(key.isnot(None), *filters)
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(tuple_(key, Model.id) > tuple_(*decode_cursor(cursor)))
+    rows = query.order_by(key, Model.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+    return jsonify(
+        data=[dict(zip(fields, (serialize(v) for v in row[2:]))) for row in rows],
+        next_cursor=next_cursor
+    )
+
+
+def genre_filter(Model):
+    genre = request.args.get('genre')
+    return [Model.inGenre(genre)] if genre else []
+
+
+@api.route('/venues')
+def venues():
+    return page(*RESOURCES['venues'], filters=genre_filter(Venue))
+
+
+@api.route('/venues/<int:venue_id>/recommendations')
+def venue_recommendations(venue_id):
+    # precomputed matches, best first
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).scalar() is None:
+        abort(404)
+    limit = min(request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int),
+                current_app.config['API_MAX_PAGE_SIZE'])
+    if limit < 1:
+        raise BadRequest('limit must be positive')
+    fields = ('artist_id', 'name', 'image_link', 'city', 'state', 'score')
+    return jsonify(data=[dict(zip(fields, row)) for row in Recommendation.forVenue(venue_id, limit)])
+
+
+@api.route('/artists')
+def artists():
+    return page(*RESOURCES['artists'], filters=genre_filter(Artist))
+
+
+def calendar_filters():
+    # ?from= / ?to= bound start_time, ?city= / ?state= the venue
+    import dateutil.parser
+    filters = []
+    try:
+        if request.args.get('from'):
+            filters.append(Show.start_time >= dateutil.parser.parse(request.args['from']))
+        if request.args.get('to'):
+            filters.append(Show.start_time < dateutil.parser.parse(request.args['to']))
+    except (ValueError, OverflowError):
+        raise BadRequest('invalid date')
+    venue_filters = []
+    if request.args.get('city'):
+        venue_filters.append(Venue.city == request.args['city'])
+    if request.args.get('state'):
+        venue_filters.append(Venue.state == request.args['state'])
+    if venue_filters:
+        filters.append(Show.venue_id.in_(db.session.query(Venue.id).filter(*venue_filters)))
+    return filters
+
+
+@api.route('/shows')
+def shows():
+    return page(*RESOURCES['shows'], filters=calendar_filters())
@@ -2,38 +2,83 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+import os
+import click
+from flask import Flask, Blueprint, render_template, request, Response, flash, redirect, url_for, stream_with_context, jsonify, abort, current_app
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
-from sqlalchemy import func, or_, and_
+from forms import VenueForm, ArtistForm, ShowForm
+from sqlalchemy.orm import load_only
+from itertools import groupby
 import datetime
-from models import db, Venue, Artist, Show
+from models import db, Venue, Artist, Show, Recommendation, fingerprint
+from search import Search
+from cache import Cache
+from jobs import Jobs
+from instrumentation import Instrumentation
+from nplusone import QueryGuard
+from conditional import conditional
+import recommendations
+from api import api
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-
-db.init_app(app)
-migrate = Migrate(app, db)
+# extensions keep their per-app state in app.extensions, one instance
+# serves every app create_app() builds
+search = Search()
+cache = Cache()
+jobs = Jobs()
+instrumentation = Instrumentation()
+query_guard = QueryGuard()
+
+# pages, write views and commands, registered on the app by create_app()
+main = Blueprint('main', __name__, cli_group=None)
+
+def create_app(config=None, migrations=True):
+  """Build the application.
+
+  config is a config object or an import string, the class named by
+  FYYUR_CONFIG or config.DevelopmentConfig by default. Serving processes
+  pass migrations=False to skip importing alembic, only `flask db` needs it.
+  """
+  app = Flask(__name__)
+  app.config.from_object(config or os.environ.get('FYYUR_CONFIG', 'config.DevelopmentConfig'))
+
+  db.init_app(app)
+  if migrations:
+    from flask_migrate import Migrate
+    Migrate(app, db)
+  search.init_app(app)
+  cache.init_app(app)
+  jobs.init_app(app)
+  instrumentation.init_app(app)
+  query_guard.init_app(app)
+  app.register_blueprint(main)
+  app.register_blueprint(api)
+
+  if not app.debug and not app.testing:
+    file_handler = FileHandler('error.log')
+    file_handler.setFormatter(
+        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+    )
+    app.logger.setLevel(logging.INFO)
+    file_handler.setLevel(logging.INFO)
+    app.logger.addHandler(file_handler)
+    app.logger.info('errors')
 
+  return app
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
+@main.app_template_filter('datetime')
 def format_datetime(value, format='medium'):
+  # parsing and locale data are only loaded once a page shows a date
+  import dateutil.parser
+  import babel.dates
   date = dateutil.parser.parse(value)
   if format == 'full':
       format="EEEE MMMM, d, y 'at' h:mma"
@@ -41,13 +86,109 @@ def format_datetime(value, format='medium'):
       format="EE MM, dd, y h:mma"
   return babel.dates.format_datetime(date, format)
 
-app.jinja_env.filters['datetime'] = format_datetime
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def stream_template(template_name, **context):
+  # render the template chunk by chunk so the first bytes go out
+  # before the whole result set has been read from the database
+  current_app.update_template_context(context)
+  template = current_app.jinja_env.get_template(template_name)
+  return Response(stream_with_context(template.stream(context)))
+
+def venue_pages(venue_id):
+  # cache keys of every page that renders this venue
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return ['index', 'venues', 'shows', 'venue:%s' % venue_id] + ['artist:%s' % a for a, in artist_ids]
+
+def artist_pages(artist_id):
+  # cache keys of every page that renders this artist
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  venue_ids = set(v for v, in venue_ids).union(recommendations.venues_recommending(artist_id))
+  return ['index', 'artists', 'shows', 'artist:%s' % artist_id] + ['venue:%s' % v for v in venue_ids]
+
+def listing_version(*Models):
+  # ETag parts for pages listing whole tables
+  return fingerprint(*Models)
+
+def shows_version():
+  # ETag parts for /shows; an omitted calendar bound defaults to today, so
+  # the resolved range goes into the tag and the cache key
+  parts = listing_version(Show, Venue, Artist)
+  if 'from' in request.args or 'to' in request.args:
+    parts += calendar_range()
+  return parts
+
+def schedule_version(Owner, Model, column, id):
+  # ETag parts for a venue or artist page
+  return Show.scheduleFingerprint(Owner, Model, column, id)
+
+def venue_version(venue_id):
+  # schedule_version plus the venue's recommended artists
+  return schedule_version(Venue, Artist, Show.venue_id, venue_id) + Recommendation.fingerprint(venue_id)
+
+def show_items(rows):
+  # turn Show.listing() rows into the dictionaries pages/shows.html expects
+  for row in rows:
+    yield {
+      'venue_id': row.venue_id,
+      'venue_name': row.venue_name,
+      'artist_id': row.artist_id,
+      'artist_name': row.artist_name,
+      'artist_image_link': row.artist_image_link,
+      'start_time': row.start_time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+#----------------------------------------------------------------------------#
+# Jobs.
+#----------------------------------------------------------------------------#
+
+JOB_MODELS = {'venue': Venue, 'artist': Artist}
+
+@jobs.task('search.add', local=True)
+def index_search(kind, id):
+  obj = JOB_MODELS[kind].query.get(id)
+  if obj is not None:
+    search.add(obj)
+
+@jobs.task('search.remove', local=True)
+def unindex_search(kind, id):
+  search.remove(JOB_MODELS[kind], id)
+
+@jobs.task('search.refresh', local=True)
+def refresh_search():
+  search.refresh()
+
+def check_search():
+  # the indexes are compared with the tables after the response, not
+  # while the user waits
+  if search.due():
+    jobs.enqueue('search.refresh')
+
+@jobs.task('cache.invalidate', local=True)
+def invalidate_pages(entities):
+  cache.invalidate(*entities)
+
+@jobs.task('recommendations.venue')
+def refresh_venue_recommendations(venue_id):
+  recommendations.refresh_venue(venue_id)
+  db.session.commit()
+  jobs.enqueue('cache.invalidate', entities=['venue:%s' % venue_id])
+
+@jobs.task('recommendations.artist')
+def refresh_artist_recommendations(artist_id):
+  matched = recommendations.refresh_artist(artist_id)
+  db.session.commit()
+  jobs.enqueue('cache.invalidate', entities=['venue:%s' % v for v in matched])
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+@main.route('/')
+@conditional(lambda: listing_version(Venue, Artist))
+@cache.cached(lambda: 'index')
 def index():
   # last added venues 
   venues = Venue.query.order_by(Venue.created_at.desc()).limit(10).all()
@@ -63,83 +204,140 @@ def index():
 
   return render_template('pages/home.html', recent=data)
 
+#  Autocomplete
+#----------------------------------------------------------------------------#
+@main.route('/autocomplete')
+def autocomplete():
+  # search as you type, answered from memory without touching the database
+  prefix = request.args.get('q', '')
+  k = min(request.args.get('k', 10, type=int), current_app.config['AUTOCOMPLETE_MAX_RESULTS'])
+  check_search()
+  return jsonify(results=search.complete(prefix, k) if prefix else [])
+
 #----------------------------------------------------------------------------#
 #  Venues
 #----------------------------------------------------------------------------#
 
 #  All Venues
 #----------------------------------------------------------------------------#
-@app.route('/venues')
+@main.route('/venues')
+@conditional(lambda: listing_version(Venue))
+@cache.cached(lambda: 'venues')
 def venues():
-  
-  # get all unique state 
-  city_state = Venue.query.distinct(Venue.city, Venue.state).all()
-  
+
+  # venues ordered by area, only the columns the page needs
+  query = Venue.query.options(load_only(Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count))
+
+  # most upcoming shows first inside every area
+  sort = request.args.get('sort')
+  if sort == 'popular':
+    query = query.order_by(Venue.state, Venue.city, Venue.upcoming_shows_count.desc(), Venue.name, Venue.id)
+  else:
+    query = query.order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+
+  # lazy loading for large catalogs, one state at a time
+  state = request.args.get('state')
+  if state:
+    query = query.filter(Venue.state == state)
+
+  genre = request.args.get('genre')
+  if genre:
+    query = query.filter(Venue.inGenre(genre))
+
+  min_upcoming = request.args.get('min_upcoming', type=int)
+  if min_upcoming:
+    query = query.filter(Venue.upcoming_shows_count >= min_upcoming)
+
+  # one page of venues, fetch one extra row to know if there is a next page
+  page = max(request.args.get('page', 1, type=int), 1)
+  per_page = current_app.config['VENUES_PER_PAGE']
+  venues = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+  has_next = len(venues) > per_page
+  venues = venues[:per_page]
+
   data = []
-  
-  # loop in all unique state
-  for cs in city_state:
-    obj = {}
-    obj['state'] = cs.state
-    obj['city'] = cs.city
-    obj['venues'] = [v.withUpcomingShows for v in Venue.query.filter_by(state=cs.state).all()]
-    data.append(obj)
-  
-  return render_template('pages/venues.html', areas=data)
+
+  # rows come sorted by state and city, so every area is one consecutive run
+  for (area_state, area_city), area_venues in groupby(venues, key=lambda v: (v.state, v.city)):
+    data.append({
+      'state': area_state,
+      'city': area_city,
+      'venues': [v.withUpcomingShows for v in area_venues]
+    })
+
+  return render_template('pages/venues.html',
+    areas=data,
+    states=Venue.stateCounts(),
+    state=state,
+    genre=genre,
+    sort=sort,
+    min_upcoming=min_upcoming,
+    page=page,
+    has_next=has_next
+  )
 
 #  Search in Venues
 #----------------------------------------------------------------------------#
-@app.route('/venues/search', methods=['POST'])
+@main.route('/venues/search', methods=['POST'])
 def search_venues():
 
   search_term = request.form.get('search_term', '')
-  
-  # search by name or state or city or city with state
-  venues = Venue.query.filter(or_(
-    Venue.name.ilike('%' + search_term + '%'),
-    Venue.state.ilike('%' + search_term + '%'), 
-    Venue.city.ilike('%' + search_term + '%'), 
-    (Venue.city + ', ' + Venue.state).like('{0}%'.format(search_term))
-  )).all()
-  
+  page = max(request.form.get('page', 1, type=int), 1)
+  per_page = current_app.config['SEARCH_PER_PAGE']
+
+  # ranked matches by name or state or city or city with state
+  genre = request.form.get('genre') or None
+  check_search()
+  total, venues = search.query(Venue, search_term, per_page, (page - 1) * per_page, genre)
+
+  counts = Venue.upcomingShowCounts(v.id for v in venues)
   response = {
-    'count': len(venues),
-    'data': [v.withUpcomingShows for v in venues]
+    'count': total,
+    'data': [{'id': v.id, 'name': v.name, 'num_upcoming_shows': counts.get(v.id, 0)} for v in venues],
+    'page': page,
+    'has_next': page * per_page < total
   }
 
-  return render_template('pages/search_venues.html', results=response, search_term=search_term)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term, genre=genre)
 
 #  Show Venue
 #----------------------------------------------------------------------------#
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/<int:venue_id>')
+@conditional(venue_version)
+@cache.cached(lambda venue_id: 'venue:%s' % venue_id)
 def show_venue(venue_id):
   # get venue by id 
   venue = Venue.query.get(venue_id)
+  if venue is None:
+    abort(404)
 
   # get venue data as dictionary
   data = venue.toDictionary
-  
-  # past show 
-  past_show = Show.query.filter(Show.start_time < datetime.datetime.now(), Show.venue_id == venue.id).all()
-  data['past_shows'] = [s.shows(Model=Artist) for s in past_show]
-  data['past_shows_count'] = len(past_show)
-
-  # upcoming shows 
-  upcoming_shows = Show.query.filter(Show.start_time > datetime.datetime.now(), Show.venue_id == venue.id).all()
-  data['upcoming_shows'] = [s.shows(Model=Artist) for s in upcoming_shows]
-  data['upcoming_shows_count'] = len(upcoming_shows)
-  
+
+  # upcoming shows and one page of past shows
+  past_page = max(request.args.get('past_page', 1, type=int), 1)
+  per_page = current_app.config['PAST_SHOWS_PER_PAGE']
+  data.update(Show.schedule(Artist, Show.venue_id, venue.id, past_page, per_page))
+  data['past_page'] = past_page
+  data['past_has_next'] = past_page * per_page < data['past_shows_count']
+
+  # precomputed best matching artists
+  data['recommended_artists'] = [
+    dict(zip(('artist_id', 'artist_name', 'artist_image_link', 'city', 'state', 'score'), row))
+    for row in Recommendation.forVenue(venue.id, current_app.config['RECOMMENDATIONS_PER_VENUE'])
+  ]
+
   return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
 
   failed = False
@@ -152,15 +350,19 @@ def create_venue_submission():
       phone = request.form['phone'],
       image_link = request.form['image_link'],
       facebook_link = request.form['facebook_link'],
-      genres = ','.join(request.form.getlist('genres')),
       website = request.form['website'],
       seeking_talent =  int(request.form['seeking_talent']),
       seeking_description = request.form['seeking_description'],
       created_at = datetime.datetime.now(),
       updated_at = datetime.datetime.now()
     )
+    venue.setGenres(request.form.getlist('genres'))
     db.session.add(venue)
+    db.session.flush()
+    jobs.enqueue('recommendations.venue', venue_id=venue.id)
     db.session.commit()
+    jobs.enqueue('search.add', kind='venue', id=venue.id)
+    jobs.enqueue('cache.invalidate', entities=['index', 'venues'])
   except:
     failed = True
     db.session.rollback()
@@ -170,16 +372,23 @@ def create_venue_submission():
     else:
       flash('Venue ' + request.form['name'] + ' was successfully listed!')
     db.session.close()  
-  return redirect(url_for('index'))
+  return redirect(url_for('.index'))
 
 #  Delete Venue
 #----------------------------------------------------------------------------#
-@app.route('/venues/<venue_id>', methods=['POST'])
+@main.route('/venues/<venue_id>', methods=['POST'])
 def delete_venue(venue_id):
   failed = False
   try:
+    pages = venue_pages(venue_id)
+    artist_ids = [a for a, in db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
+    # the venue's shows go with it, take them out of their artists' counters
+    Show.query.filter_by(venue_id=venue_id).delete()
     Venue.query.filter_by(id=venue_id).delete()
+    Show.recount(Artist, artist_ids)
     db.session.commit()
+    jobs.enqueue('search.remove', kind='venue', id=int(venue_id))
+    jobs.enqueue('cache.invalidate', entities=pages)
   except:
     failed = True
     db.session.rollback()
@@ -189,63 +398,78 @@ def delete_venue(venue_id):
     else:
       flash('Venue was successfully deleted!')
     db.session.close()
-  return redirect(url_for('index'))
+  return redirect(url_for('.index'))
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@main.route('/artists')
+@conditional(lambda: listing_version(Artist))
+@cache.cached(lambda: 'artists')
 def artists():
-  data = Artist.query.with_entities(Artist.id, Artist.name)
-  return render_template('pages/artists.html', artists=data)
+  data = Artist.query.with_entities(Artist.id, Artist.name, Artist.upcoming_shows_count)
+  genre = request.args.get('genre')
+  if genre:
+    data = data.filter(Artist.inGenre(genre))
+  min_upcoming = request.args.get('min_upcoming', type=int)
+  if min_upcoming:
+    data = data.filter(Artist.upcoming_shows_count >= min_upcoming)
+  # most upcoming shows first, read off ix_artists_upcoming_shows_count_id
+  sort = request.args.get('sort')
+  if sort == 'popular':
+    data = data.order_by(Artist.upcoming_shows_count.desc(), Artist.id.desc())
+  return render_template('pages/artists.html', artists=data, genre=genre, sort=sort, min_upcoming=min_upcoming)
 
 #  Search in Artists
 #  ----------------------------------------------------------------
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['POST'])
 def search_artists():
   
   search_term = request.form.get('search_term', '')
-  
-  # search by name or state or city or city with state
-  artists = Artist.query.filter(or_(
-    Artist.name.ilike('%' + search_term + '%'),
-    Artist.state.ilike('%' + search_term + '%'), 
-    Artist.city.ilike('%' + search_term + '%'), 
-    (Artist.city + ', ' + Artist.state).like('{0}%'.format(search_term))
-  )).all()
+  page = max(request.form.get('page', 1, type=int), 1)
+  per_page = current_app.config['SEARCH_PER_PAGE']
 
+  # ranked matches by name or state or city or city with state
+  genre = request.form.get('genre') or None
+  check_search()
+  total, artists = search.query(Artist, search_term, per_page, (page - 1) * per_page, genre)
+
+  counts = Artist.upcomingShowCounts(a.id for a in artists)
   response = {
-    'count': len(artists),
-    'data': [a.withUpcomingShows for a in artists]
+    'count': total,
+    'data': [{'id': a.id, 'name': a.name, 'num_upcoming_shows': counts.get(a.id, 0)} for a in artists],
+    'page': page,
+    'has_next': page * per_page < total
   }
 
-  return render_template('pages/search_artists.html', results=response, search_term=search_term)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term, genre=genre)
 
 #  Show Artist
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/<int:artist_id>')
+@conditional(lambda artist_id: schedule_version(Artist, Venue, Show.artist_id, artist_id))
+@cache.cached(lambda artist_id: 'artist:%s' % artist_id)
 def show_artist(artist_id):
 
   # get artist by id 
   artist = Artist.query.get(artist_id)
+  if artist is None:
+    abort(404)
 
   # get artist data as dictionary
   data = artist.toDictionary
-  
-  # past show 
-  past_show = Show.query.filter(Show.start_time < datetime.datetime.now(), Show.artist_id == artist.id).all()
-  data['past_shows'] = [s.shows(Model=Venue) for s in past_show]
-  data['past_shows_count'] = len(past_show)
 
-  # upcoming shows 
-  upcoming_shows = Show.query.filter(Show.start_time > datetime.datetime.now(), Show.artist_id == artist.id).all()
-  data['upcoming_shows'] = [s.shows(Model=Venue) for s in upcoming_shows]
-  data['upcoming_shows_count'] = len(upcoming_shows)
+  # upcoming shows and one page of past shows
+  past_page = max(request.args.get('past_page', 1, type=int), 1)
+  per_page = current_app.config['PAST_SHOWS_PER_PAGE']
+  data.update(Show.schedule(Venue, Show.artist_id, artist.id, past_page, per_page))
+  data['past_page'] = past_page
+  data['past_has_next'] = past_page * per_page < data['past_shows_count']
 
   return render_template('pages/show_artist.html', artist=data)
 
 #  Update Artist
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   artist = Artist.query.get(artist_id)
   form = ArtistForm(
@@ -264,7 +488,7 @@ def edit_artist(artist_id):
 
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   failed = False
   try:
@@ -275,7 +499,7 @@ def edit_artist_submission(artist_id):
     artist.phone = request.form['phone']
     artist.image_link = request.form['image_link']
     artist.facebook_link = request.form['facebook_link']
-    artist.genres = ','.join(request.form.getlist('genres'))
+    artist.setGenres(request.form.getlist('genres'))
     artist.website = request.form['website']
     artist.seeking_venue =  int(request.form['seeking_venue'])
     artist.seeking_description = request.form['seeking_description']
@@ -283,7 +507,10 @@ def edit_artist_submission(artist_id):
     artist.available_to_date = request.form['available_to_date'],
     artist.updated_at = datetime.datetime.now()
     db.session.add(artist)
+    jobs.enqueue('recommendations.artist', artist_id=artist.id)
     db.session.commit()
+    jobs.enqueue('search.add', kind='artist', id=artist.id)
+    jobs.enqueue('cache.invalidate', entities=artist_pages(artist_id))
   except:
     failed = True
     db.session.rollback()
@@ -294,11 +521,11 @@ def edit_artist_submission(artist_id):
       flash('Artist ' + artist.name + ' was successfully updated!')  
     db.session.close()  
 
-  return redirect(url_for('show_artist', artist_id=artist_id))
+  return redirect(url_for('.show_artist', artist_id=artist_id))
 
 #  Update Venue
 #  ----------------------------------------------------------------
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   venue = Venue.query.get(venue_id)
   form = VenueForm(
@@ -316,7 +543,7 @@ def edit_venue(venue_id):
 
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   failed = False
   try:
@@ -328,13 +555,16 @@ def edit_venue_submission(venue_id):
     venue.phone = request.form['phone']
     venue.image_link = request.form['image_link']
     venue.facebook_link = request.form['facebook_link']
-    venue.genres = ','.join(request.form.getlist('genres'))
+    venue.setGenres(request.form.getlist('genres'))
     venue.website = request.form['website']
     venue.seeking_talent =  int(request.form['seeking_talent'])
     venue.seeking_description = request.form['seeking_description']
     venue.updated_at = datetime.datetime.now()
     db.session.add(venue)
+    jobs.enqueue('recommendations.venue', venue_id=venue.id)
     db.session.commit()
+    jobs.enqueue('search.add', kind='venue', id=venue.id)
+    jobs.enqueue('cache.invalidate', entities=venue_pages(venue_id))
   except:
     failed = True
     db.session.rollback()
@@ -344,17 +574,17 @@ def edit_venue_submission(venue_id):
     else:
       flash('Venue ' + venue.name + ' was successfully updated!')
     db.session.close()
-  return redirect(url_for('show_venue', venue_id=venue_id))
+  return redirect(url_for('.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   failed = False
   try:
@@ -365,7 +595,6 @@ def create_artist_submission():
       phone = request.form['phone'],
       image_link = request.form['image_link'],
       facebook_link = request.form['facebook_link'],
-      genres = ','.join(request.form.getlist('genres')),
       website = request.form['website'],
       seeking_venue =  int(request.form['seeking_venue']),
       seeking_description = request.form['seeking_description'],
@@ -374,8 +603,13 @@ def create_artist_submission():
       created_at = datetime.datetime.now(),
       updated_at = datetime.datetime.now()
     )
+    artist.setGenres(request.form.getlist('genres'))
     db.session.add(artist)
+    db.session.flush()
+    jobs.enqueue('recommendations.artist', artist_id=artist.id)
     db.session.commit()
+    jobs.enqueue('search.add', kind='artist', id=artist.id)
+    jobs.enqueue('cache.invalidate', entities=['index', 'artists'])
   except:
     failed = True
     db.session.rollback()
@@ -385,16 +619,23 @@ def create_artist_submission():
     else:
       flash('Artist ' + request.form['name'] + ' was successfully listed!')
     db.session.close()    
-  return redirect(url_for('index'))
+  return redirect(url_for('.index'))
 
 #  Delete Artist
 #  ----------------------------------------------------------------
-@app.route('/artists/<artist_id>', methods=['POST'])
+@main.route('/artists/<artist_id>', methods=['POST'])
 def delete_artist(artist_id):
   failed = False
   try:
+    pages = artist_pages(artist_id)
+    venue_ids = [v for v, in db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()]
+    # the artist's shows go with it, take them out of their venues' counters
+    Show.query.filter_by(artist_id=artist_id).delete()
     Artist.query.filter_by(id=artist_id).delete()
+    Show.recount(Venue, venue_ids)
     db.session.commit()
+    jobs.enqueue('search.remove', kind='artist', id=int(artist_id))
+    jobs.enqueue('cache.invalidate', entities=pages)
   except:
     failed = True
     db.session.rollback()
@@ -404,95 +645,289 @@ def delete_artist(artist_id):
     else:
       flash('Artist was successfully deleted!')
     db.session.close()
-  return redirect(url_for('index'))
+  return redirect(url_for('.index'))
 
 #  Shows
 #  ----------------------------------------------------------------
-@app.route('/shows')
+@main.route('/shows')
+@conditional(shows_version)
+@cache.cached(lambda: 'shows')
 def shows():
-  data = []
-  shows = Show.query.all()
-  for s in shows:
-    venue = Venue.query.get(s.venue_id)
-    artist = Artist.query.get(s.artist_id)
-    data.append({
-      'venue_id': venue.id,
-      'venue_name': venue.name,
-      'artist_id': artist.id,
-      'artist_name': artist.name,
-      'artist_image_link': artist.image_link,
-      'start_time': s.start_time.strftime("%Y-%m-%d %H:%M:%S")
-    })
-  return render_template('pages/shows.html', shows=data)
+  # calendar mode, shows of a date range grouped by day
+  if 'from' in request.args or 'to' in request.args:
+    return shows_calendar()
+
+  query = Show.listing()
+
+  # stream every show without holding the result set in memory
+  if request.args.get('all'):
+    rows = query.yield_per(current_app.config['SHOWS_STREAM_BATCH'])
+    return stream_template('pages/shows.html', shows=show_items(rows))
+
+  # one page of shows, fetch one extra row to know if there is a next page
+  page = max(request.args.get('page', 1, type=int), 1)
+  per_page = current_app.config['SHOWS_PER_PAGE']
+  rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+  return render_template('pages/shows.html',
+    shows=show_items(rows[:per_page]),
+    page=page,
+    has_next=len(rows) > per_page
+  )
+
+def parse_day(value, default):
+  if not value:
+    return default
+  import dateutil.parser
+  try:
+    return dateutil.parser.parse(value).date()
+  except (ValueError, OverflowError):
+    abort(400)
+
+def calendar_range():
+  # [from, to] in whole days, to defaults to a week after from
+  start = parse_day(request.args.get('from'), datetime.date.today())
+  end = parse_day(request.args.get('to'), start + datetime.timedelta(days=6))
+  if end < start or (end - start).days >= current_app.config['CALENDAR_MAX_DAYS']:
+    abort(400)
+  return start, end
+
+def shows_calendar():
+  start, end = calendar_range()
+  city = request.args.get('city')
+  state = request.args.get('state')
+
+  rows = Show.calendar(
+    datetime.datetime.combine(start, datetime.time.min),
+    datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min),
+    city, state
+  )
+
+  # rows come ordered by start_time, so every day is one consecutive run
+  days = []
+  for day, day_rows in groupby(rows, key=lambda r: r.start_time.date()):
+    days.append({'date': day, 'shows': list(show_items(day_rows))})
+
+  return render_template('pages/shows_calendar.html',
+    days=days, start=start, end=end, city=city, state=state)
 
-@app.route('/shows/create')
+@main.route('/shows/create')
 def create_shows():
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
   artist_id = request.form['artist_id']
-  artist = Artist.query.get(artist_id)
-  if not artist.isAvailable:
-    flash('Sorry, The Artist ' + artist.name + ' not available in this time, only available from ' + artist.available_from_date.strftime("%Y-%m-%d %H:%M:%S") + ' to ' + artist.available_to_date.strftime("%Y-%m-%d %H:%M:%S"))
-    return redirect(url_for('create_shows'))
+  venue_id = request.form['venue_id']
+  import dateutil.parser
+  try:
+    start_time = dateutil.parser.parse(request.form['start_time'])
+  except (ValueError, OverflowError):
+    flash('Sorry, ' + request.form['start_time'] + ' is not a valid start time.')
+    return redirect(url_for('.create_shows'))
 
   failed = False
+  conflict = None
   try:
-    artist_id = artist_id
-    venue_id = request.form['venue_id']
-    start_time = request.form['start_time']
-    show = Show(
-      artist_id=artist_id, 
-      venue_id=venue_id, 
-      start_time=start_time,
-      created_at = datetime.datetime.now(),
-      updated_at = datetime.datetime.now()
-      )
-    db.session.add(show)
-    db.session.commit()
+    # lock the venue, then the artist: concurrent bookings of either one
+    # wait here until this one commits, and the fixed order can't deadlock
+    venue = Venue.query.filter_by(id=venue_id).with_for_update().one()
+    artist = Artist.query.filter_by(id=artist_id).with_for_update().one()
+
+    if not artist.isAvailableAt(start_time):
+      conflict = 'Sorry, The Artist ' + artist.name + ' not available in this time, only available ' + artist.availability
+    elif Show.conflicts(venue.id, artist.id, start_time, current_app.config['SHOW_DURATION']).first() is not None:
+      conflict = 'Sorry, ' + venue.name + ' or ' + artist.name + ' already has a show booked around ' + start_time.strftime("%Y-%m-%d %H:%M:%S")
+    else:
+      show = Show(
+        artist_id=artist.id,
+        venue_id=venue.id,
+        start_time=start_time,
+        created_at = datetime.datetime.now(),
+        updated_at = datetime.datetime.now()
+        )
+      db.session.add(show)
+      Show.bump(venue.id, artist.id, start_time)
+      db.session.commit()
+      jobs.enqueue('cache.invalidate',
+        entities=['shows', 'venues', 'artists', 'venue:%s' % venue.id, 'artist:%s' % artist.id])
   except:
     failed = True
-    db.session.rollback()
   finally:
-    if failed: 
+    if failed or conflict:
+      # also releases the row locks
+      db.session.rollback()
+    if failed:
       flash('An error occurred. Show could not be listed.')
+    elif conflict:
+      flash(conflict)
     else:
       flash('Show was successfully listed!')
-    db.session.close()  
-  return redirect(url_for('index'))
+    db.session.close()
+  if conflict:
+    return redirect(url_for('.create_shows'))
+  return redirect(url_for('.index'))
+
+#  Export
+#  ----------------------------------------------------------------
+@main.route('/export/<entity>.<fmt>')
+def export(entity, fmt):
+  import exports
+  if entity not in exports.MODELS or fmt not in exports.MIMETYPES:
+    abort(404)
+  chunks = exports.export(entity, fmt, current_app.config['EXPORT_BATCH_SIZE'])
+  return Response(stream_with_context(chunks),
+    mimetype=exports.MIMETYPES[fmt],
+    headers={'Content-Disposition': 'attachment; filename=%s.%s' % (entity, fmt)}
+  )
+
+#  Cache
+#  ----------------------------------------------------------------
+@main.route('/cache/stats')
+def cache_stats():
+  return jsonify(cache.stats())
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
 
-@app.errorhandler(404)
+@main.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+  help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True)
+def import_command(kind, source, fmt, batch_size):
+  """Bulk load venues, artists or shows from CSV or JSON Lines."""
+  from importer import Importer, read_records
+  if fmt is None:
+    fmt = 'jsonl' if os.path.splitext(source.name)[1] in ('.jsonl', '.json') else 'csv'
+
+  result = Importer(kind, batch_size).run(read_records(source, fmt))
+
+  for number, errors in result.rejected[:20]:
+    click.echo('record %d rejected: %s' % (number, errors), err=True)
+  click.echo('%d %s imported, %d rejected in %.2fs (%.0f rows/s)' % (
+    result.inserted, kind, len(result.rejected), result.elapsed, result.rate))
+
+  # bulk inserts bypass the views, refresh what they would have updated
+  if kind == 'shows':
+    Show.recount(Venue)
+    Show.recount(Artist)
+  else:
+    recommendations.rebuild()
+  db.session.commit()
+  # nothing to clear here: running servers rebuild their search indexes and
+  # miss their cached pages once these rows changed, see search.py and cache.py
+
+@main.cli.command('seed')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=2000, show_default=True)
+@click.option('--shows', default=20000, show_default=True)
+@click.option('--seed', 'seed_value', default=0, show_default=True,
+  help='Random seed, the same seed gives the same data on the same day.')
+@click.option('--today', type=click.DateTime(['%Y-%m-%d']),
+  help='Day shows are generated around, today by default.')
+@click.option('--batch-size', default=1000, show_default=True)
+def seed_command(venues, artists, shows, seed_value, today, batch_size):
+  """Fill the database with synthetic venues, artists and shows."""
+  from importer import Importer
+  from synthetic import Generator
+  generator = Generator(seed_value, today and today.date())
+
+  # through the importer, with the validation `flask import` does
+  for kind, count in (('venues', venues), ('artists', artists), ('shows', shows)):
+    result = Importer(kind, batch_size).run(getattr(generator, kind)(count))
+    for number, errors in result.rejected[:20]:
+      click.echo('%s record %d rejected: %s' % (kind, number, errors), err=True)
+    click.echo('%d %s seeded in %.2fs' % (result.inserted, kind, result.elapsed))
+
+  Show.recount(Venue)
+  Show.recount(Artist)
+  recommendations.rebuild()
+  db.session.commit()
+
+@main.cli.group('recommendations')
+def recommendations_command():
+  """Manage the precomputed venue recommendations."""
+
+@recommendations_command.command('rebuild')
+@click.option('--batch-size', default=1000, show_default=True)
+def rebuild_recommendations(batch_size):
+  """Recompute every venue's recommended artists.
+
+  Run it periodically, scores depend on the current date through artist
+  availability.
+  """
+  total = recommendations.rebuild(batch_size)
+  db.session.commit()
+  click.echo('%d recommendations stored' % total)
+
+@main.cli.group('counters')
+def counters_command():
+  """Maintain the upcoming and past show counters."""
+
+@counters_command.command('roll')
+@click.option('--since', type=click.DateTime(),
+  help='Roll shows that started after this time, COUNTERS_ROLL_WINDOW ago by default.')
+def roll_counters(since):
+  """Move shows that started since the last run from upcoming to past.
+
+  Schedule it more often than COUNTERS_ROLL_WINDOW, e.g. every 15 minutes
+  from cron, so the windows of consecutive runs overlap.
+  """
+  now = datetime.datetime.now()
+  since = since or now - current_app.config['COUNTERS_ROLL_WINDOW']
+  venue_ids, artist_ids = Show.roll(since, now)
+  db.session.commit()
+  click.echo('%d venues, %d artists recounted' % (len(venue_ids), len(artist_ids)))
+
+@counters_command.command('rebuild')
+def rebuild_counters():
+  """Recount every venue and artist from the shows table."""
+  venues = Show.recount(Venue)
+  artists = Show.recount(Artist)
+  db.session.commit()
+  click.echo('%d venues, %d artists recounted' % (venues, artists))
+
+@main.cli.group('jobs')
+def jobs_command():
+  """Run and inspect background jobs."""
+
+@jobs_command.command('work')
+@click.option('--once', is_flag=True, help='Exit once no job is due.')
+def work_jobs(once):
+  """Run queued jobs: retries, leftovers of crashed processes and jobs
+  enqueued outside of requests."""
+  done = jobs.work(once)
+  click.echo('%d jobs done' % done)
+
+@jobs_command.command('status')
+def jobs_status():
+  """Number of queued, running and failed jobs."""
+  for status, count in sorted(jobs.stats().items()):
+    click.echo('%-8s %d' % (status, count))
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
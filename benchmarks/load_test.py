@@ -0,0 +1,115 @@
+#----------------------------------------------------------------------------#
+# Requests per second of the production server for a growing number of
+# gunicorn workers.
+#
+#   SECRET_KEY=... DATABASE_URL=... python benchmarks/load_test.py --workers 1 2 4 8
+#
+# Every round starts `gunicorn -c gunicorn.conf.py wsgi:app` with
+# WEB_CONCURRENCY set to the worker count, waits for it to answer and then
+# runs --clients client processes, each one sending GET requests over a
+# keep-alive connection for --duration seconds.
+#----------------------------------------------------------------------------#
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def client(args):
+  host, port, paths, duration = args
+  conn = http.client.HTTPConnection(host, port, timeout=30)
+  latencies = []
+  errors = 0
+  deadline = time.perf_counter() + duration
+  i = 0
+  while time.perf_counter() < deadline:
+    path = paths[i % len(paths)]
+    i += 1
+    start = time.perf_counter()
+    try:
+      conn.request('GET', path)
+      response = conn.getresponse()
+      response.read()
+      if response.status >= 400:
+        errors += 1
+    except (OSError, http.client.HTTPException):
+      errors += 1
+      conn.close()
+      conn = http.client.HTTPConnection(host, port, timeout=30)
+      continue
+    latencies.append(time.perf_counter() - start)
+  conn.close()
+  return latencies, errors
+
+
+def wait_until_ready(host, port, timeout=30):
+  deadline = time.time() + timeout
+  while time.time() < deadline:
+    try:
+      conn = http.client.HTTPConnection(host, port, timeout=1)
+      conn.request('GET', '/')
+      conn.getresponse().read()
+      return
+    except OSError:
+      time.sleep(0.2)
+  raise RuntimeError('server did not start within %ds' % timeout)
+
+
+def percentile(values, p):
+  return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def run(workers, args):
+  env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND='%s:%d' % (args.host, args.port))
+  server = subprocess.Popen(
+    [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+    cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  try:
+    wait_until_ready(args.host, args.port)
+    jobs = [(args.host, args.port, args.paths, args.duration)] * args.clients
+    with multiprocessing.Pool(args.clients) as pool:
+      results = pool.map(client, jobs)
+  finally:
+    server.send_signal(signal.SIGTERM)
+    server.wait()
+
+  latencies = sorted(l for r in results for l in r[0])
+  errors = sum(r[1] for r in results)
+  return {
+    'workers': workers,
+    'requests': len(latencies),
+    'errors': errors,
+    'rps': len(latencies) / args.duration,
+    'p50': percentile(latencies, 0.50) * 1000,
+    'p95': percentile(latencies, 0.95) * 1000,
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Measure throughput against the number of gunicorn workers.')
+  parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+  parser.add_argument('--clients', type=int, default=32)
+  parser.add_argument('--duration', type=float, default=10)
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--paths', nargs='+', default=['/', '/venues', '/artists', '/shows'])
+  args = parser.parse_args()
+
+  results = [run(workers, args) for workers in args.workers]
+
+  base = results[0]['rps'] or 1.0
+  print('%8s %10s %8s %10s %10s %10s %8s' % ('workers', 'requests', 'errors', 'req/s', 'p50 (ms)', 'p95 (ms)', 'scaling'))
+  for r in results:
+    print('%8d %10d %8d %10.1f %10.2f %10.2f %7.2fx' % (
+      r['workers'], r['requests'], r['errors'], r['rps'], r['p50'], r['p95'], r['rps'] / base))
+
+
+if __name__ == '__main__':
+  main()
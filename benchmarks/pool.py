@@ -0,0 +1,136 @@
+#----------------------------------------------------------------------------#
+# Database connection pool size against gunicorn workers and threads.
+#
+#   SECRET_KEY=... DATABASE_URL=... python benchmarks/pool.py --threads 4 8 --pool-sizes 1 2 4 8
+#
+# For every thread count and pool size the script starts
+# `gunicorn -c gunicorn.conf.py wsgi:app` with WEB_CONCURRENCY=--workers,
+# GUNICORN_THREADS, DB_POOL_SIZE and DB_MAX_OVERFLOW=--max-overflow (0 by
+# default, so the pool size is a hard limit) and runs --clients client
+# processes for --duration seconds. The pool entry of every response's
+# Server-Timing header is the time that request waited for a connection.
+# A pool smaller than the thread count shows up as checkout waits and, past
+# DB_POOL_TIMEOUT, as 500s; a larger one only holds more connections open.
+# Run it against PostgreSQL, SQLite has a pool of its own that is not timed.
+#----------------------------------------------------------------------------#
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+from load_test import wait_until_ready, percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+POOL = re.compile(r'pool;dur=([\d.]+)')
+
+
+def client(args):
+  host, port, paths, duration = args
+  conn = http.client.HTTPConnection(host, port, timeout=60)
+  latencies = []
+  waits = []
+  errors = 0
+  deadline = time.perf_counter() + duration
+  i = 0
+  while time.perf_counter() < deadline:
+    path = paths[i % len(paths)]
+    i += 1
+    start = time.perf_counter()
+    try:
+      conn.request('GET', path)
+      response = conn.getresponse()
+      response.read()
+    except (OSError, http.client.HTTPException):
+      errors += 1
+      conn.close()
+      conn = http.client.HTTPConnection(host, port, timeout=60)
+      continue
+    if response.status >= 400:
+      errors += 1
+      continue
+    latencies.append(time.perf_counter() - start)
+    match = POOL.search(response.getheader('Server-Timing') or '')
+    if match:
+      waits.append(float(match.group(1)) / 1000)
+  conn.close()
+  return latencies, waits, errors
+
+
+def run(threads, pool_size, args):
+  env = dict(os.environ,
+    WEB_CONCURRENCY=str(args.workers),
+    GUNICORN_THREADS=str(threads),
+    DB_POOL_SIZE=str(pool_size),
+    DB_MAX_OVERFLOW=str(args.max_overflow),
+    DB_POOL_TIMEOUT=str(args.pool_timeout),
+    BIND='%s:%d' % (args.host, args.port))
+  server = subprocess.Popen(
+    [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+    cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  try:
+    wait_until_ready(args.host, args.port)
+    jobs = [(args.host, args.port, args.paths, args.duration)] * args.clients
+    with multiprocessing.Pool(args.clients) as pool:
+      results = pool.map(client, jobs)
+  finally:
+    server.send_signal(signal.SIGTERM)
+    server.wait()
+
+  latencies = sorted(l for r in results for l in r[0])
+  waits = sorted(w for r in results for w in r[1])
+  return {
+    'threads': threads,
+    'pool_size': pool_size,
+    'connections': args.workers * (pool_size + args.max_overflow),
+    'requests': len(latencies),
+    'errors': sum(r[2] for r in results),
+    'rps': len(latencies) / args.duration,
+    'p50': percentile(latencies, 0.50) * 1000,
+    'p95': percentile(latencies, 0.95) * 1000,
+    'wait_p95': percentile(waits, 0.95) * 1000,
+    # requests that queued for a connection at all
+    'waited': sum(1 for w in waits if w > 0.001) * 100.0 / len(waits) if waits else 0.0,
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Measure checkout waits and throughput against the pool size.')
+  parser.add_argument('--workers', type=int, default=2)
+  parser.add_argument('--threads', type=int, nargs='+', default=[4, 8])
+  parser.add_argument('--pool-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+  parser.add_argument('--max-overflow', type=int, default=0)
+  parser.add_argument('--pool-timeout', type=float, default=10)
+  parser.add_argument('--clients', type=int, default=32)
+  parser.add_argument('--duration', type=float, default=10)
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--paths', nargs='+', default=['/venues', '/artists', '/shows', '/venues/1', '/artists/1'])
+  args = parser.parse_args()
+
+  results = [run(threads, pool_size, args) for threads in args.threads for pool_size in args.pool_sizes]
+
+  print('%8s %6s %12s %10s %8s %10s %10s %10s %14s %8s' % (
+    'threads', 'pool', 'connections', 'requests', 'errors', 'req/s', 'p50 (ms)', 'p95 (ms)', 'wait p95 (ms)', 'waited'))
+  for r in results:
+    print('%8d %6d %12d %10d %8d %10.1f %10.2f %10.2f %14.2f %7.1f%%' % (
+      r['threads'], r['pool_size'], r['connections'], r['requests'], r['errors'],
+      r['rps'], r['p50'], r['p95'], r['wait_p95'], r['waited']))
+
+  # the smallest pool within 5% of the best throughput, per thread count
+  for threads in args.threads:
+    rows = [r for r in results if r['threads'] == threads]
+    best = max(r['rps'] for r in rows)
+    enough = min((r for r in rows if r['rps'] >= best * 0.95), key=lambda r: r['pool_size'])
+    print('%d threads: pool_size %d is enough (%d connections for %d workers)' % (
+      threads, enough['pool_size'], enough['connections'], args.workers))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,397 @@
+#----------------------------------------------------------------------------#
+# Latency and queries per request of every page and form of app.py, on a
+# database seeded by `flask seed`.
+#
+#   python benchmarks/routes.py --output before.json
+#   git checkout other-branch
+#   python benchmarks/routes.py --output after.json --compare before.json
+#
+# Every scenario (list, search, detail, create, edit pages) runs --repeat
+# times through the Flask test client, then through a local HTTP server
+# with --clients concurrent connections. The report holds p50/p95/p99
+# latency in ms, queries per request (from the Server-Timing header) and
+# status codes per scenario; with the same arguments two runs give
+# reports that diff key by key.
+#
+# By default the database is a fresh SQLite file in a temporary directory,
+# --database takes the URL of a scratch database with the Fyyur schema
+# (`flask db upgrade`) instead. Jobs run eagerly at the end of each request
+# and the page cache is off unless --cache says otherwise. Delete views are
+# left out, they would empty the data set under the other scenarios.
+#----------------------------------------------------------------------------#
+
+import argparse
+import datetime
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import TestingConfig, engine_options
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+GENRES = ['Jazz', 'Rock n Roll']
+
+
+def make_config(args):
+  class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = args.database
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(args.database)
+    CACHE_BACKEND = 'lru' if args.cache else 'null'
+    INSTRUMENTATION_LOG = False
+    NPLUSONE_ENABLED = False
+  return BenchmarkConfig
+
+
+def create(args):
+  from app import create_app
+  return create_app(make_config(args), migrations=False)
+
+
+#----------------------------------------------------------------------------#
+# Scenarios, each one a function of a random generator returning
+# (method, path, form data or None).
+#----------------------------------------------------------------------------#
+
+def venue_form(rng, name):
+  return {
+    'name': name,
+    'city': rng.choice(['New York', 'Austin', 'Seattle']),
+    'state': rng.choice(['NY', 'TX', 'WA']),
+    'address': '%d Main St' % rng.randint(1, 999),
+    'phone': '555-555-5555',
+    'image_link': 'https://picsum.photos/300',
+    'facebook_link': 'https://www.facebook.com/venue',
+    'website': 'https://www.venue.com',
+    'genres': GENRES,
+    'seeking_talent': '1',
+    'seeking_description': 'Looking for bands.',
+  }
+
+
+def artist_form(rng, name):
+  form = venue_form(rng, name)
+  del form['address'], form['seeking_talent']
+  form.update({'seeking_venue': '1', 'available_from_date': '', 'available_to_date': ''})
+  return form
+
+
+def scenarios(data):
+  venue_ids, artist_ids, terms = data['venue_ids'], data['artist_ids'], data['terms']
+  today = datetime.date.today()
+  counter = iter(range(10 ** 9))
+
+  def new_show(rng):
+    start = datetime.datetime.combine(today, datetime.time(20)) + datetime.timedelta(
+      days=rng.randint(200, 2000), minutes=rng.randint(0, 59))
+    return ('POST', '/shows/create', {
+      'venue_id': str(rng.choice(venue_ids)),
+      'artist_id': str(rng.choice(artist_ids)),
+      'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+    })
+
+  return [
+    # list
+    ('list', 'index', lambda rng: ('GET', '/', None)),
+    ('list', 'venues', lambda rng: ('GET', '/venues', None)),
+    ('list', 'venues by state', lambda rng: ('GET', '/venues?state=' + rng.choice(data['states']), None)),
+    ('list', 'venues popular', lambda rng: ('GET', '/venues?sort=popular', None)),
+    ('list', 'artists', lambda rng: ('GET', '/artists', None)),
+    ('list', 'artists popular', lambda rng: ('GET', '/artists?sort=popular', None)),
+    ('list', 'shows', lambda rng: ('GET', '/shows', None)),
+    ('list', 'shows calendar', lambda rng: ('GET', '/shows?from=%s&to=%s' % (
+      today, today + datetime.timedelta(days=7)), None)),
+    ('list', 'export venues', lambda rng: ('GET', '/export/venues.csv', None)),
+    # search
+    ('search', 'search venues', lambda rng: ('POST', '/venues/search', {'search_term': rng.choice(terms)})),
+    ('search', 'search artists', lambda rng: ('POST', '/artists/search', {'search_term': rng.choice(terms)})),
+    ('search', 'autocomplete', lambda rng: ('GET', '/autocomplete?q=' + rng.choice(terms)[:3], None)),
+    # detail
+    ('detail', 'venue', lambda rng: ('GET', '/venues/%d' % rng.choice(venue_ids), None)),
+    ('detail', 'artist', lambda rng: ('GET', '/artists/%d' % rng.choice(artist_ids), None)),
+    # create
+    ('create', 'venue form', lambda rng: ('GET', '/venues/create', None)),
+    ('create', 'artist form', lambda rng: ('GET', '/artists/create', None)),
+    ('create', 'show form', lambda rng: ('GET', '/shows/create', None)),
+    ('create', 'create venue', lambda rng: ('POST', '/venues/create', venue_form(rng, 'Bench Venue %d' % next(counter)))),
+    ('create', 'create artist', lambda rng: ('POST', '/artists/create', artist_form(rng, 'Bench Artist %d' % next(counter)))),
+    ('create', 'create show', new_show),
+    # edit
+    ('edit', 'venue edit form', lambda rng: ('GET', '/venues/%d/edit' % rng.choice(venue_ids), None)),
+    ('edit', 'artist edit form', lambda rng: ('GET', '/artists/%d/edit' % rng.choice(artist_ids), None)),
+    ('edit', 'edit venue', lambda rng: ('POST', '/venues/%d/edit' % rng.choice(venue_ids),
+      venue_form(rng, 'Bench Venue %d' % next(counter)))),
+    ('edit', 'edit artist', lambda rng: ('POST', '/artists/%d/edit' % rng.choice(artist_ids),
+      artist_form(rng, 'Bench Artist %d' % next(counter)))),
+  ]
+
+
+def scenario_rng(seed, name):
+  # the same requests in the same order on every run
+  return random.Random(seed * 1000003 + zlib.crc32(name.encode()))
+
+
+#----------------------------------------------------------------------------#
+# Measurements.
+#----------------------------------------------------------------------------#
+
+def percentile(values, p):
+  values = sorted(values)
+  return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def summary(latencies, queries, statuses, elapsed=None):
+  result = {
+    'requests': len(latencies),
+    'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+    'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+    'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+    'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+    'queries_max': max(queries) if queries else None,
+    'statuses': dict((str(s), statuses.count(s)) for s in sorted(set(statuses))),
+  }
+  if elapsed:
+    result['rps'] = round(len(latencies) / elapsed, 1)
+  return result
+
+
+def query_count(header):
+  match = QUERIES.search(header or '')
+  return int(match.group(1)) if match else None
+
+
+def run_client(app, data, args):
+  client = app.test_client()
+  results = {}
+  for group, name, make in scenarios(data):
+    rng = scenario_rng(args.seed, name)
+    for _ in range(args.warmup):
+      method, path, form = make(rng)
+      client.open(path, method=method, data=form).close()
+    latencies, queries, statuses = [], [], []
+    for _ in range(args.repeat):
+      method, path, form = make(rng)
+      start = time.perf_counter()
+      response = client.open(path, method=method, data=form)
+      response.get_data()
+      latencies.append(time.perf_counter() - start)
+      statuses.append(response.status_code)
+      count = query_count(response.headers.get('Server-Timing'))
+      if count is not None:
+        queries.append(count)
+      response.close()
+    results[name] = dict(summary(latencies, queries, statuses), group=group)
+    print('client %-20s p50 %8.2f ms  p95 %8.2f ms  %s queries' % (
+      name, results[name]['p50_ms'], results[name]['p95_ms'], results[name]['queries_mean']), file=sys.stderr)
+  return results
+
+
+def serve(args, port):
+  import logging
+  from werkzeug.serving import make_server
+  # no access log line per request
+  logging.getLogger('werkzeug').setLevel(logging.ERROR)
+  app = create(args)
+  make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def free_port():
+  sock = socket.socket()
+  sock.bind(('127.0.0.1', 0))
+  port = sock.getsockname()[1]
+  sock.close()
+  return port
+
+
+def wait_until_ready(port, timeout=30):
+  deadline = time.time() + timeout
+  while time.time() < deadline:
+    try:
+      conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+      conn.request('GET', '/autocomplete')
+      conn.getresponse().read()
+      return
+    except OSError:
+      time.sleep(0.1)
+  raise RuntimeError('server did not start on port %d' % port)
+
+
+def http_worker(port, requests, results):
+  conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+  for method, path, form in requests:
+    body, headers = None, {}
+    if form is not None:
+      body = urlencode(form, doseq=True)
+      headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    start = time.perf_counter()
+    try:
+      conn.request(method, path, body, headers)
+      response = conn.getresponse()
+      response.read()
+    except (OSError, http.client.HTTPException):
+      conn.close()
+      conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+      results.append((time.perf_counter() - start, None, 599))
+      continue
+    results.append((time.perf_counter() - start, query_count(response.getheader('Server-Timing')), response.status))
+  conn.close()
+
+
+def run_http(args, data):
+  port = free_port()
+  server = multiprocessing.Process(target=serve, args=(args, port), daemon=True)
+  server.start()
+  try:
+    wait_until_ready(port)
+    results = {}
+    for group, name, make in scenarios(data):
+      rng = scenario_rng(args.seed, name)
+      requests = [make(rng) for _ in range(args.warmup + args.repeat)]
+      http_worker(port, requests[:args.warmup], [])
+      requests = requests[args.warmup:]
+      # the same requests split over the clients
+      outcomes = []
+      threads = [threading.Thread(target=http_worker, args=(port, requests[i::args.clients], outcomes))
+        for i in range(args.clients)]
+      start = time.perf_counter()
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+      elapsed = time.perf_counter() - start
+      results[name] = dict(summary(
+        [latency for latency, _, _ in outcomes],
+        [count for _, count, _ in outcomes if count is not None],
+        [status for _, _, status in outcomes],
+        elapsed), group=group)
+      print('http   %-20s p50 %8.2f ms  p95 %8.2f ms  %6.1f req/s' % (
+        name, results[name]['p50_ms'], results[name]['p95_ms'], results[name]['rps']), file=sys.stderr)
+    return results
+  finally:
+    server.terminate()
+    server.join()
+
+
+#----------------------------------------------------------------------------#
+# Setup and report.
+#----------------------------------------------------------------------------#
+
+def prepare(app, args):
+  from models import db, Venue, Artist
+  with app.app_context():
+    if args.fresh:
+      db.create_all()
+    if not args.skip_seed:
+      result = app.test_cli_runner().invoke(args=['seed',
+        '--venues', str(args.venues), '--artists', str(args.artists),
+        '--shows', str(args.shows), '--seed', str(args.seed)])
+      if result.exit_code != 0:
+        raise RuntimeError('flask seed failed:\n%s' % result.output) from result.exception
+      print(result.output.strip(), file=sys.stderr)
+    venues = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state).order_by(Venue.id).all()
+    artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+    db.session.remove()
+  if not venues or not artist_ids:
+    raise RuntimeError('no venues or artists to benchmark')
+  return {
+    'venue_ids': [v.id for v in venues],
+    'artist_ids': artist_ids,
+    'states': sorted(set(v.state for v in venues)),
+    # names, cities and partial words, as people search
+    'terms': sorted(set([v.city for v in venues] + [v.name.split()[1] for v in venues if ' ' in v.name])),
+  }
+
+
+def revision():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+      cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def compare(report, previous):
+  print('\n%-8s %-20s %12s %12s %12s' % ('mode', 'scenario', 'p50', 'p95', 'queries'))
+  for mode in ('client', 'http'):
+    for name, now in report.get(mode, {}).items():
+      before = previous.get(mode, {}).get(name)
+      if before is None:
+        continue
+      def change(key):
+        if not before.get(key) or now.get(key) is None:
+          return '-'
+        return '%+.0f%%' % ((now[key] - before[key]) * 100.0 / before[key])
+      print('%-8s %-20s %12s %12s %12s' % (mode, name, change('p50_ms'), change('p95_ms'), change('queries_mean')))
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark every page and form on a seeded database.')
+  parser.add_argument('--database', help='SQLAlchemy URL of a scratch database, a temporary SQLite file by default')
+  parser.add_argument('--venues', type=int, default=1000)
+  parser.add_argument('--artists', type=int, default=2000)
+  parser.add_argument('--shows', type=int, default=20000)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--skip-seed', action='store_true', help='Benchmark the data already in --database')
+  parser.add_argument('--repeat', type=int, default=100, help='Measured requests per scenario and mode')
+  parser.add_argument('--warmup', type=int, default=5)
+  parser.add_argument('--clients', type=int, default=4, help='Concurrent connections in HTTP mode')
+  parser.add_argument('--mode', choices=['client', 'http', 'both'], default='both')
+  parser.add_argument('--cache', action='store_true', help='Turn the in-process page cache on')
+  parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+  parser.add_argument('--compare', help='Earlier JSON report to print relative changes against')
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    args.fresh = args.database is None
+    if args.fresh:
+      args.database = 'sqlite:///' + os.path.join(tmp, 'fyyur.db')
+    app = create(args)
+    data = prepare(app, args)
+
+    report = {
+      'settings': {
+        'revision': revision(),
+        'database': args.database.split(':', 1)[0],
+        'venues': args.venues,
+        'artists': args.artists,
+        'shows': args.shows,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'clients': args.clients,
+        'cache': args.cache,
+      },
+    }
+    if args.mode in ('client', 'both'):
+      report['client'] = run_client(app, data, args)
+    if args.mode in ('http', 'both'):
+      report['http'] = run_http(args, data)
+
+  text = json.dumps(report, indent=2, sort_keys=True)
+  if args.output:
+    with open(args.output, 'w') as f:
+      f.write(text + '\n')
+  else:
+    print(text)
+
+  if args.compare:
+    with open(args.compare) as f:
+      compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,72 @@
+#----------------------------------------------------------------------------#
+# Cold start of the application: wall time to import the code and build an
+# app with create_app(), and the import profile behind it.
+#
+#   python benchmarks/startup.py
+#   python benchmarks/startup.py --runs 20 --top 30 --migrations
+#
+# Every run is a fresh interpreter, like a new container. The profile comes
+# from `python -X importtime` and lists the slowest imports by cumulative
+# time, the indentation shows who imported what.
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import time
+start = time.perf_counter()
+from app import create_app
+create_app(migrations={migrations})
+print(time.perf_counter() - start)
+"""
+
+
+def run(migrations, importtime=False):
+  command = [sys.executable]
+  if importtime:
+    command += ['-X', 'importtime']
+  command += ['-c', SCRIPT.format(migrations=migrations)]
+  result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+  return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def profile(stderr):
+  # "import time: self [us] | cumulative | imported package" lines
+  rows = []
+  for line in stderr.splitlines():
+    if not line.startswith('import time:') or 'self [us]' in line:
+      continue
+    own, cumulative, name = line[len('import time:'):].split('|')
+    rows.append((int(cumulative), int(own), name.rstrip()))
+  return rows
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Measure import and create_app() time.')
+  parser.add_argument('--runs', type=int, default=10)
+  parser.add_argument('--top', type=int, default=20, help='slowest imports to list')
+  parser.add_argument('--migrations', action='store_true',
+    help='build the app with Flask-Migrate, as `flask db` does')
+  args = parser.parse_args()
+
+  run(args.migrations)  # warm the filesystem and bytecode caches
+  timings = sorted(run(args.migrations)[0] * 1000 for _ in range(args.runs))
+  print('create_app() cold start over %d runs: median %.1f ms, min %.1f ms, max %.1f ms' % (
+    args.runs, statistics.median(timings), timings[0], timings[-1]))
+
+  _, stderr = run(args.migrations, importtime=True)
+  rows = profile(stderr)
+  print('\n%d modules imported, %.1f ms in total' % (len(rows), sum(r[1] for r in rows) / 1000.0))
+  print('\n%12s %12s  %s' % ('cumul (ms)', 'self (ms)', 'module'))
+  for cumulative, own, name in sorted(rows, reverse=True)[:args.top]:
+    print('%12.1f %12.1f  %s' % (cumulative / 1000.0, own / 1000.0, name))
+
+
+if __name__ == '__main__':
+  main()
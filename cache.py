@@ -0,0 +1,203 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, request, session
+from routing import wrote_recently
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#
+# Rendered GET pages are cached under an entity key ('venues', 'venue:3',
+# ...) chosen by the view. Every entity key owns a generation token, a page
+# is stored under entity + generation + ETag, and invalidating an entity
+# drops its token so every variant of the page (query strings, pagination)
+# misses on the next read.
+#
+# The ETag is the one @conditional computed from the database for this
+# request (it covers the request path), so a page also misses once its rows
+# changed, whoever changed them: another server process with its own 'lru'
+# cache or a command like `flask import`. Cached views sit under
+# @conditional; without it the request path stands in for the ETag.
+#
+# CACHE_BACKEND selects where pages live:
+#   'lru'    in-process LRU with a TTL (default)
+#   'shared' a store shared between processes through a redis-py style
+#            client, CACHE_SHARED_CLIENT or one built from CACHE_SHARED_URL
+#   'null'   caching disabled
+#----------------------------------------------------------------------------#
+
+
+class LRUBackend(object):
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            self.entries[key] = (time.time() + ttl if ttl else None, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SharedBackend(object):
+
+    def __init__(self, client, ttl=300, prefix='fyyur:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, value, ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class NullBackend(object):
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class Cache(object):
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'lru')
+        app.config.setdefault('CACHE_MAXSIZE', 1024)
+        app.config.setdefault('CACHE_TTL', 300)
+        app.config.setdefault('CACHE_SHARED_URL', None)
+        app.config.setdefault('CACHE_SHARED_CLIENT', None)
+        app.extensions['cache'] = {
+            'backend': self.make_backend(app.config),
+            'lock': threading.Lock(),
+            'hits': 0,
+            'misses': 0,
+        }
+
+    @staticmethod
+    def make_backend(config):
+        kind = config['CACHE_BACKEND']
+        if kind == 'lru':
+            return LRUBackend(config['CACHE_MAXSIZE'], config['CACHE_TTL'])
+        if kind == 'shared':
+            client = config['CACHE_SHARED_CLIENT']
+            if client is None:
+                # optional dependency, only needed for a real shared store
+                import redis
+                client = redis.Redis.from_url(config['CACHE_SHARED_URL'])
+            return SharedBackend(client, config['CACHE_TTL'])
+        if kind == 'null':
+            return NullBackend()
+        raise ValueError('unknown CACHE_BACKEND: %r' % kind)
+
+    @property
+    def state(self):
+        return current_app.extensions['cache']
+
+    @property
+    def backend(self):
+        return self.state['backend']
+
+    def generation(self, entity):
+        token = self.backend.get('gen:' + entity)
+        if token is None:
+            token = uuid.uuid4().hex
+            self.backend.set('gen:' + entity, token, ttl=0)
+        return token
+
+    def count(self, name):
+        with self.state['lock']:
+            self.state[name] += 1
+
+    def cached(self, entity):
+        """Cache the rendered page of a GET view under entity(**view_args)."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # pending flash messages are rendered into the page, never cache those
+                if request.method != 'GET' or session.get('_flashes'):
+                    return view(*args, **kwargs)
+                name = entity(**kwargs)
+                key = 'page:{0}:{1}:{2}'.format(name, self.generation(name), g.get('etag') or request.full_path)
+                # right after a write of this browser its reads go to the
+                # primary, a page stored from a lagging replica must not
+                # answer them
+                body = None if wrote_recently(current_app) else self.backend.get(key)
+                if body is not None:
+                    self.count('hits')
+                    return body
+                self.count('misses')
+                rv = view(*args, **kwargs)
+                # only plain rendered pages, streamed responses pass through
+                if isinstance(rv, str):
+                    self.backend.set(key, rv)
+                return rv
+            return wrapper
+        return decorator
+
+    def invalidate(self, *entities):
+        for entity in entities:
+            self.backend.delete('gen:' + entity)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        hits, misses = self.state['hits'], self.state['misses']
+        return {
+            'backend': current_app.config['CACHE_BACKEND'],
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': float(hits) / (hits + misses) if hits + misses else 0.0,
+        }
@@ -0,0 +1,47 @@
+import hashlib
+from functools import wraps
+from flask import g, request, session, make_response
+from werkzeug.http import is_resource_modified
+
+#----------------------------------------------------------------------------#
+# Conditional requests.
+#
+# Views wrapped with @conditional(fingerprint) answer If-None-Match with a
+# 304 before the view runs. fingerprint(**view_args) is a cheap aggregate
+# query over the rows the page renders and returns a tuple of parts (max
+# updated_at and row counts); the ETag hashes the parts together with the
+# request path so every query-string variant gets its own tag, and is kept
+# in g.etag for the page cache.
+#
+# There is no Last-Modified: max(updated_at) stays put when a row is
+# deleted, so If-Modified-Since would get a 304 for a page that lost rows.
+# The row counts in the ETag catch those.
+#----------------------------------------------------------------------------#
+
+
+def conditional(fingerprint):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # a 304 would hide pending flash messages, render those
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            parts = fingerprint(**kwargs)
+            etag = hashlib.sha1(repr((request.full_path,) + tuple(parts)).encode('utf-8')).hexdigest()
+            # the page cache keys on it too, see cache.py
+            g.etag = etag
+
+            if not is_resource_modified(request.environ, etag=etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # always revalidate, the 304 keeps that cheap
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
@@ -0,0 +1,67 @@
+import csv
+import datetime
+import io
+import json
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#
+# Rows are read through a server-side cursor (yield_per) and encoded as they
+# arrive, so an export streams in constant memory and the first bytes go out
+# before the whole table has been read.
+#----------------------------------------------------------------------------#
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show,
+}
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def serialize(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def rows(Model, batch_size):
+    columns = list(Model.__table__.columns)
+    query = db.session.query(*columns).order_by(Model.id).yield_per(batch_size)
+    return [c.name for c in columns], query
+
+
+def csv_chunks(names, rows, chunk_rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([serialize(v) for v in row])
+        if i % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_chunks(names, rows, chunk_rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, row)), default=serialize))
+        if len(lines) >= chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export(entity, fmt, batch_size=1000, chunk_rows=500):
+    """Generator of text chunks of the entity table in fmt ('csv' or 'jsonl')."""
+    names, query = rows(MODELS[entity], batch_size)
+    chunks = csv_chunks if fmt == 'csv' else jsonl_chunks
+    return chunks(names, query, chunk_rows)
@@ -1,9 +1,9 @@
 from datetime import datetime
-from flask_wtf import Form
+from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, TextAreaField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms.validators import DataRequired, InputRequired, AnyOf, URL
 
-class ShowForm(Form):
+class ShowForm(FlaskForm):
     artist_id = StringField(
         'artist_id'
     )
@@ -16,7 +16,7 @@ class ShowForm(Form):
         default= datetime.today()
     )
 
-class VenueForm(Form):
+class VenueForm(FlaskForm):
     name = StringField(
         'name', validators=[DataRequired()]
     )
@@ -123,7 +123,7 @@ class VenueForm(Form):
         'image_link', validators=[URL()]
     )
     seeking_talent = SelectField(
-        'seeking_talent', validators=[DataRequired()],
+        'seeking_talent', validators=[InputRequired()], coerce=int,
         choices=[
             (0, 'No'),
             (1, 'Yes'),
@@ -132,7 +132,7 @@ class VenueForm(Form):
     seeking_description = TextAreaField(
         'seeking_description'
     )
-class ArtistForm(Form):
+class ArtistForm(FlaskForm):
     name = StringField(
         'name', validators=[DataRequired()]
     )
@@ -238,7 +238,7 @@ class ArtistForm(Form):
         'image_link', validators=[URL()]
     )
     seeking_venue = SelectField(
-        'seeking_venue', validators=[DataRequired()],
+        'seeking_venue', validators=[InputRequired()], coerce=int,
         choices=[
             (0, 'No'),
             (1, 'Yes'),
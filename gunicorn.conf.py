@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+
+#----------------------------------------------------------------------------#
+# Gunicorn settings, every one of them can be overridden from the
+# environment.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Reloading: `kill -HUP <master>` starts fresh workers with the new
+# settings and stops the old ones once their requests are done
+# (graceful_timeout). Preloaded code is only read again by a new master:
+# deploy with `kill -USR2 <master>` and then `kill -TERM <old master>`, or
+# set GUNICORN_PRELOAD=0 to make HUP reload the code as well.
+#----------------------------------------------------------------------------#
+
+bind = os.environ.get('BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+
+# processes for CPU bound work (rendering), threads to overlap database
+# round trips; (2 x cores) + 1 keeps every core busy while some workers wait
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# import the app and compile its templates once, in the master
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# recycle workers now and then, staggered so they don't restart together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # connections opened by the master must not be shared with the workers
+    from models import db
+    from wsgi import app
+    with app.app_context():
+        db.engine.dispose()
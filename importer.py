@@ -0,0 +1,226 @@
+import csv
+import datetime
+import json
+import time
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+# Streams CSV or JSON Lines records, validates each one with the same form
+# the create views use, and inserts them in batches with one executemany per
+# batch. Shows may reference their venue and artist by id or by name
+# ("venue" / "artist"), names are resolved through an in-memory map loaded
+# once per run; with duplicate names the highest id wins.
+#----------------------------------------------------------------------------#
+
+FORMS = {
+    'venues': VenueForm,
+    'artists': ArtistForm,
+    'shows': ShowForm,
+}
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show,
+}
+
+GENRE_TABLES = {
+    'venues': (venue_genres, 'venue_id'),
+    'artists': (artist_genres, 'artist_id'),
+}
+
+
+def read_records(stream, fmt):
+    if fmt == 'csv':
+        for record in csv.DictReader(stream):
+            yield record
+    elif fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        raise ValueError('unknown format: %r' % fmt)
+
+
+def form_data(record):
+    # genres may come as a list (JSON) or a comma-joined string (CSV),
+    # empty values are left out so optional fields stay unset
+    data = MultiDict()
+    for key, value in record.items():
+        if value is None or value == '':
+            continue
+        if key == 'genres':
+            values = value if isinstance(value, list) else value.split(',')
+            for genre in values:
+                data.add(key, genre.strip())
+        else:
+            data.add(key, str(value))
+    return data
+
+
+class Importer(object):
+
+    def __init__(self, kind, batch_size=1000):
+        self.kind = kind
+        self.Model = MODELS[kind]
+        self.Form = FORMS[kind]
+        self.batch_size = batch_size
+        self.inserted = 0
+        self.rejected = []
+        self.venue_ids = None
+        self.artist_ids = None
+        self.genre_ids = {}
+        self.now = datetime.datetime.now()
+        # highest id this run inserted so far
+        self.last_id = 0
+
+    def run(self, records):
+        start = time.perf_counter()
+        batch = []
+        for number, record in enumerate(records, 1):
+            row = self.validate(number, record)
+            if row is None:
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+        self.elapsed = time.perf_counter() - start
+        return self
+
+    @property
+    def rate(self):
+        return self.inserted / self.elapsed if self.elapsed else 0.0
+
+    def validate(self, number, record):
+        if self.kind == 'shows':
+            record = self.resolve(record)
+        data = form_data(record)
+        form = self.Form(formdata=data, meta={'csrf': False})
+        if not form.validate():
+            self.rejected.append((number, form.errors))
+            return None
+        if self.kind == 'shows':
+            errors = self.check_references(form)
+            if errors:
+                self.rejected.append((number, errors))
+                return None
+        return getattr(self, 'row_' + self.kind)(form, data)
+
+    def resolve(self, record):
+        # venue / artist names to ids, maps are loaded once per run
+        if self.venue_ids is None:
+            self.venue_ids = dict(db.session.query(Venue.name, Venue.id).order_by(Venue.id))
+            self.artist_ids = dict(db.session.query(Artist.name, Artist.id).order_by(Artist.id))
+            self.known_ids = (set(self.venue_ids.values()), set(self.artist_ids.values()))
+        record = dict(record)
+        if not record.get('venue_id') and record.get('venue'):
+            record['venue_id'] = self.venue_ids.get(record['venue'])
+        if not record.get('artist_id') and record.get('artist'):
+            record['artist_id'] = self.artist_ids.get(record['artist'])
+        return record
+
+    def check_references(self, form):
+        errors = {}
+        venue_ids, artist_ids = self.known_ids
+        for field, known in ((form.venue_id, venue_ids), (form.artist_id, artist_ids)):
+            if not (field.data or '').isdigit() or int(field.data) not in known:
+                errors[field.name] = ['Unknown or missing reference.']
+        return errors
+
+    def value(self, form, data, name):
+        # coerced form value for fields present in the record, None otherwise
+        return getattr(form, name).data if name in data else None
+
+    def row_venues(self, form, data):
+        return {
+            'name': form.name.data,
+            'city': form.city.data,
+            'state': form.state.data,
+            'address': form.address.data,
+            'phone': self.value(form, data, 'phone'),
+            'image_link': form.image_link.data,
+            'facebook_link': form.facebook_link.data,
+            'genres': ','.join(form.genres.data),
+            'website': form.website.data,
+            'seeking_talent': bool(form.seeking_talent.data),
+            'seeking_description': self.value(form, data, 'seeking_description'),
+            'created_at': self.now,
+            'updated_at': self.now,
+        }
+
+    def row_artists(self, form, data):
+        return {
+            'name': form.name.data,
+            'city': form.city.data,
+            'state': form.state.data,
+            'phone': self.value(form, data, 'phone'),
+            'image_link': form.image_link.data,
+            'facebook_link': form.facebook_link.data,
+            'genres': ','.join(form.genres.data),
+            'website': form.website.data,
+            'seeking_venue': bool(form.seeking_venue.data),
+            'seeking_description': self.value(form, data, 'seeking_description'),
+            'available_from_date': self.value(form, data, 'available_from_date'),
+            'available_to_date': self.value(form, data, 'available_to_date'),
+            'created_at': self.now,
+            'updated_at': self.now,
+        }
+
+    def row_shows(self, form, data):
+        return {
+            'venue_id': int(form.venue_id.data),
+            'artist_id': int(form.artist_id.data),
+            'start_time': form.start_time.data,
+            'created_at': self.now,
+            'updated_at': self.now,
+        }
+
+    def flush(self, batch):
+        if self.kind == 'shows':
+            # one executemany per batch
+            db.session.execute(Show.__table__.insert(), batch)
+        else:
+            self.insert_with_ids(batch)
+            self.link_genres(batch)
+        db.session.commit()
+        self.inserted += len(batch)
+
+    def insert_with_ids(self, batch):
+        # one executemany per batch, then the new ids to link genres to:
+        # RETURNING where the driver supports it with executemany
+        # (psycopg2), otherwise one select of this run's new rows, they all
+        # carry its created_at. Rows are matched by (name, city, state),
+        # duplicates in id order, which is insertion order.
+        table = self.Model.__table__
+        columns = (table.c.id, table.c.name, table.c.city, table.c.state)
+        if db.engine.dialect.insert_executemany_returning:
+            rows = db.session.execute(table.insert().returning(*columns), batch).fetchall()
+        else:
+            db.session.execute(table.insert(), batch)
+            rows = db.session.query(*columns) \
+                .filter(table.c.created_at == self.now, table.c.id > self.last_id).all()
+        ids = {}
+        for id, name, city, state in sorted(rows):
+            ids.setdefault((name, city, state), []).append(id)
+        for row in batch:
+            row['id'] = ids[(row['name'], row['city'], row['state'])].pop(0)
+        self.last_id = max(self.last_id, max(row['id'] for row in batch))
+
+    def link_genres(self, batch):
+        table, column = GENRE_TABLES[self.kind]
+        names = set(g for row in batch for g in row['genres'].split(','))
+        missing = names.difference(self.genre_ids)
+        if missing:
+            self.genre_ids.update(Genre.ids(missing))
+        db.session.execute(table.insert(), [
+            {column: row['id'], 'genre_id': self.genre_ids[name]}
+            for row in batch for name in set(row['genres'].split(','))
+        ])
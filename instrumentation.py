@@ -0,0 +1,296 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, has_request_context, request
+from flask import request_started, before_render_template, template_rendered
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+#----------------------------------------------------------------------------#
+# Request instrumentation.
+#
+# Every request records its number of SQL queries, the time spent in them,
+# the time spent rendering Jinja templates and its wall time:
+#   - SQLAlchemy before/after_cursor_execute events time the queries
+#   - Flask's request_started, before_render_template and template_rendered
+#     signals (they need blinker) time the request and its templates
+#   - TimedQueuePool times connection checkouts, when the engine has a
+#     queue pool (SQLALCHEMY_ENGINE_OPTIONS sets pool_size)
+# and reports them
+#   - in a Server-Timing response header, shown by browser dev tools
+#   - as one JSON log line per request on app.logger
+#   - as per-route histograms at /metrics, in Prometheus text format
+#
+# Metrics live in the process serving the request: with several gunicorn
+# workers every worker exposes its own, scrape each one or aggregate them.
+#----------------------------------------------------------------------------#
+
+# seconds, the default Prometheus client buckets
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+# checkouts are usually well under a millisecond, until the pool runs dry
+CHECKOUT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # one count per bucket plus +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield '%s_bucket{%s,le="%s"} %d' % (name, labels, bound, cumulative)
+        yield '%s_sum{%s} %s' % (name, labels, repr(self.sum))
+        yield '%s_count{%s} %d' % (name, labels, self.count)
+
+
+# name -> (help, buckets), every one is kept per route and method
+HISTOGRAMS = {
+    'fyyur_request_duration_seconds': ('Wall time of a request.', TIME_BUCKETS),
+    'fyyur_request_db_seconds': ('Time spent in SQL queries per request.', TIME_BUCKETS),
+    'fyyur_request_render_seconds': ('Time spent rendering templates per request.', TIME_BUCKETS),
+    'fyyur_request_queries': ('SQL queries per request.', QUERY_BUCKETS),
+}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that times checkouts and counts connections opened and closed.
+
+    The wait of a checkout covers queueing for a free connection, opening
+    an overflow one and the pre-ping. Counters start over when the engine
+    is disposed, every forked worker has its own.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.checkout_wait = Histogram(CHECKOUT_BUCKETS)
+        self.timeouts = 0
+        self.opened = 0
+        self.closed = 0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super(TimedQueuePool, self).connect()
+        except exc.TimeoutError:
+            with self.stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            with self.stats_lock:
+                self.checkout_wait.observe(wait)
+            if has_request_context() and 'timings' in g:
+                g.timings['pool'] += wait
+
+    def _create_connection(self):
+        record = super(TimedQueuePool, self)._create_connection()
+        with self.stats_lock:
+            self.opened += 1
+        return record
+
+    def _close_connection(self, connection, *args, **kwargs):
+        # recycled, invalidated or overflow connections given back; newer
+        # SQLAlchemy versions pass terminate=
+        with self.stats_lock:
+            self.closed += 1
+        return super(TimedQueuePool, self)._close_connection(connection, *args, **kwargs)
+
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Instrumentation(object):
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('INSTRUMENTATION_LOG', True)
+        options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+        if 'pool_size' in options and 'poolclass' not in options:
+            # a copy, the dictionary is shared with the config class
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(options, poolclass=TimedQueuePool)
+        app.extensions['instrumentation'] = {
+            'lock': threading.Lock(),
+            # (route, method) -> {histogram name: Histogram}
+            'routes': {},
+            # (route, method, status) -> count
+            'requests': {},
+        }
+        listen_engine()
+        request_started.connect(self.started, app)
+        before_render_template.connect(self.render_started, app)
+        template_rendered.connect(self.render_finished, app)
+        app.after_request(self.finished)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+
+    @staticmethod
+    def started(sender, **extra):
+        g.timings = {'start': time.perf_counter(), 'queries': 0, 'db': 0.0, 'pool': 0.0, 'render': 0.0}
+
+    @staticmethod
+    def render_started(sender, template, context, **extra):
+        timings = g.get('timings')
+        if timings is not None:
+            timings['render_start'] = time.perf_counter()
+
+    @staticmethod
+    def render_finished(sender, template, context, **extra):
+        timings = g.get('timings')
+        if timings is not None and 'render_start' in timings:
+            timings['render'] += time.perf_counter() - timings.pop('render_start')
+
+    def finished(self, response):
+        timings = g.pop('timings', None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings['start']
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        response.headers['Server-Timing'] = ', '.join([
+            'db;dur=%.1f;desc="%d queries"' % (timings['db'] * 1000, timings['queries']),
+            'pool;dur=%.1f' % (timings['pool'] * 1000),
+            'render;dur=%.1f' % (timings['render'] * 1000),
+            'total;dur=%.1f' % (total * 1000),
+        ])
+
+        if current_app.config['INSTRUMENTATION_LOG']:
+            current_app.logger.info('request %s', json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'status': response.status_code,
+                'queries': timings['queries'],
+                'db_ms': round(timings['db'] * 1000, 2),
+                'pool_ms': round(timings['pool'] * 1000, 2),
+                'render_ms': round(timings['render'] * 1000, 2),
+                'total_ms': round(total * 1000, 2),
+            }, sort_keys=True))
+
+        state = current_app.extensions['instrumentation']
+        with state['lock']:
+            histograms = state['routes'].get((route, request.method))
+            if histograms is None:
+                histograms = state['routes'][(route, request.method)] = dict(
+                    (name, Histogram(buckets)) for name, (_, buckets) in HISTOGRAMS.items())
+            histograms['fyyur_request_duration_seconds'].observe(total)
+            histograms['fyyur_request_db_seconds'].observe(timings['db'])
+            histograms['fyyur_request_render_seconds'].observe(timings['render'])
+            histograms['fyyur_request_queries'].observe(timings['queries'])
+            key = (route, request.method, response.status_code)
+            state['requests'][key] = state['requests'].get(key, 0) + 1
+        return response
+
+    def metrics(self):
+        state = current_app.extensions['instrumentation']
+        lines = []
+        with state['lock']:
+            lines.append('# HELP fyyur_requests_total Requests served.')
+            lines.append('# TYPE fyyur_requests_total counter')
+            for (route, method, status), count in sorted(state['requests'].items()):
+                lines.append('fyyur_requests_total{route="%s",method="%s",status="%s"} %d' % (
+                    label(route), method, status, count))
+            for name, (help, _) in HISTOGRAMS.items():
+                lines.append('# HELP %s %s' % (name, help))
+                lines.append('# TYPE %s histogram' % name)
+                for (route, method), histograms in sorted(state['routes'].items()):
+                    labels = 'route="%s",method="%s"' % (label(route), method)
+                    lines.extend(histograms[name].samples(name, labels))
+        lines.extend(self.extension_metrics())
+        lines.extend(self.pool_metrics())
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    def extension_metrics(self):
+        # page cache counters, when the cache extension is installed
+        cache = current_app.extensions.get('cache')
+        if cache is None:
+            return []
+        return [
+            '# HELP fyyur_cache_hits_total Page cache hits.',
+            '# TYPE fyyur_cache_hits_total counter',
+            'fyyur_cache_hits_total %d' % cache['hits'],
+            '# HELP fyyur_cache_misses_total Page cache misses.',
+            '# TYPE fyyur_cache_misses_total counter',
+            'fyyur_cache_misses_total %d' % cache['misses'],
+        ]
+
+    def pool_metrics(self):
+        # occupancy of the engine's queue pool, checkout waits and churn
+        sqlalchemy = current_app.extensions.get('sqlalchemy')
+        pool = sqlalchemy.db.engine.pool if sqlalchemy is not None else None
+        if not isinstance(pool, QueuePool):
+            return []
+        lines = [
+            '# HELP fyyur_db_pool_size Connections the pool keeps open.',
+            '# TYPE fyyur_db_pool_size gauge',
+            'fyyur_db_pool_size %d' % pool.size(),
+            '# HELP fyyur_db_pool_checked_out Connections in use.',
+            '# TYPE fyyur_db_pool_checked_out gauge',
+            'fyyur_db_pool_checked_out %d' % pool.checkedout(),
+            '# HELP fyyur_db_pool_checked_in Idle connections in the pool.',
+            '# TYPE fyyur_db_pool_checked_in gauge',
+            'fyyur_db_pool_checked_in %d' % pool.checkedin(),
+            '# HELP fyyur_db_pool_overflow Connections open beyond the pool size, negative while below it.',
+            '# TYPE fyyur_db_pool_overflow gauge',
+            'fyyur_db_pool_overflow %d' % pool.overflow(),
+        ]
+        if isinstance(pool, TimedQueuePool):
+            with pool.stats_lock:
+                lines.append('# HELP fyyur_db_pool_checkout_seconds Wait for a connection from the pool.')
+                lines.append('# TYPE fyyur_db_pool_checkout_seconds histogram')
+                lines.extend(pool.checkout_wait.samples('fyyur_db_pool_checkout_seconds', 'pool="default"'))
+                lines.extend([
+                    '# HELP fyyur_db_pool_timeouts_total Checkouts that gave up after pool_timeout.',
+                    '# TYPE fyyur_db_pool_timeouts_total counter',
+                    'fyyur_db_pool_timeouts_total %d' % pool.timeouts,
+                    '# HELP fyyur_db_pool_connections_opened_total Database connections opened.',
+                    '# TYPE fyyur_db_pool_connections_opened_total counter',
+                    'fyyur_db_pool_connections_opened_total %d' % pool.opened,
+                    '# HELP fyyur_db_pool_connections_closed_total Database connections closed.',
+                    '# TYPE fyyur_db_pool_connections_closed_total counter',
+                    'fyyur_db_pool_connections_closed_total %d' % pool.closed,
+                ])
+        return lines
+
+
+_listening = []
+
+
+def listen_engine():
+    # once per process, the events are registered on the Engine class and
+    # fire for every engine
+    if _listening:
+        return
+    _listening.append(True)
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'timings' in g:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts or not has_request_context() or 'timings' not in g:
+        return
+    g.timings['db'] += time.perf_counter() - starts.pop()
+    g.timings['queries'] += 1
@@ -0,0 +1,228 @@
+import datetime
+import json
+import threading
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g, has_request_context
+from models import db, Job
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#
+# Write views enqueue their side work instead of doing it inline. A task is
+#   local    work on this process' memory (page cache, search indexes); it
+#            runs on the in-process thread pool once the response is ready
+#   durable  database work; enqueue() adds a row to the jobs table in the
+#            current transaction, so the job exists only if the write
+#            commits. The thread pool starts it right after the request,
+#            `flask jobs work` picks up the rest: retries, jobs of crashed
+#            processes and jobs enqueued outside of requests.
+#
+# Failed jobs are retried JOBS_MAX_ATTEMPTS times in total, with an
+# exponential backoff from JOBS_RETRY_DELAY seconds; local jobs wait for
+# theirs on a timer, not on a thread of the pool. With JOBS_EAGER every
+# job runs inline at the end of the request (retries included, without
+# waiting), so tests run offline and deterministic.
+#----------------------------------------------------------------------------#
+
+Task = namedtuple('Task', ['name', 'func', 'local'])
+
+
+class Jobs(object):
+
+    def __init__(self, app=None):
+        self.tasks = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_EAGER', False)
+        app.config.setdefault('JOBS_WORKERS', 4)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOBS_RETRY_DELAY', 2)
+        app.config.setdefault('JOBS_POLL_INTERVAL', 1)
+        app.config.setdefault('JOBS_LOCK_TIMEOUT', 300)
+        app.extensions['jobs'] = {
+            # created on first use, so forked server workers get their own
+            'executor': None,
+            'lock': threading.Lock(),
+        }
+        app.after_request(self.dispatch)
+
+    def task(self, name, local=False):
+        """Register func as the handler of jobs called name."""
+        def decorator(func):
+            self.tasks[name] = Task(name, func, local)
+            return func
+        return decorator
+
+    def enqueue(self, name, **kwargs):
+        task = self.tasks[name]
+        if task.local:
+            if not has_request_context():
+                # commands and workers: nothing to answer first, run it now
+                return self.run_local(task, kwargs, wait=True)
+            g.setdefault('local_jobs', []).append((task, kwargs))
+            return None
+        job = Job(name=name, payload=json.dumps(kwargs))
+        db.session.add(job)
+        if has_request_context():
+            # the id is all dispatch() needs, the row itself only
+            # becomes visible if the view commits
+            db.session.flush()
+            g.setdefault('durable_jobs', []).append(job.id)
+        return job
+
+    @property
+    def executor(self):
+        state = current_app.extensions['jobs']
+        with state['lock']:
+            if state['executor'] is None:
+                state['executor'] = ThreadPoolExecutor(
+                    current_app.config['JOBS_WORKERS'], thread_name_prefix='jobs')
+            return state['executor']
+
+    def dispatch(self, response):
+        # after_request: start the jobs the request enqueued; durable jobs
+        # of a view that rolled back are gone and fail to be claimed
+        local = g.pop('local_jobs', [])
+        durable = g.pop('durable_jobs', [])
+        if current_app.config['JOBS_EAGER']:
+            for task, kwargs in local:
+                self.run_local(task, kwargs)
+            for id in durable:
+                self.run_durable(id)
+        elif local or durable:
+            app = current_app._get_current_object()
+            for task, kwargs in local:
+                self.executor.submit(self.in_context, app, self.run_local, task, kwargs)
+            for id in durable:
+                self.executor.submit(self.in_context, app, self.run_durable, id)
+        return response
+
+    @staticmethod
+    def in_context(app, func, *args):
+        with app.app_context():
+            return func(*args)
+
+    def backoff(self, attempts):
+        return current_app.config['JOBS_RETRY_DELAY'] * 2 ** (attempts - 1)
+
+    def run_local(self, task, kwargs, attempt=1, wait=False):
+        # a failed attempt on the thread pool is retried by a timer after
+        # the backoff, no pool thread sits it out; with wait (commands)
+        # sleep and retry inline, with JOBS_EAGER retry right away
+        eager = current_app.config['JOBS_EAGER']
+        while True:
+            try:
+                return task.func(**kwargs)
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception('job %s failed, attempt %d', task.name, attempt)
+            if attempt >= current_app.config['JOBS_MAX_ATTEMPTS']:
+                return None
+            if not eager and not wait:
+                self.retry_later(task, kwargs, attempt)
+                return None
+            if not eager:
+                time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def retry_later(self, task, kwargs, attempt):
+        app = current_app._get_current_object()
+        timer = threading.Timer(self.backoff(attempt), self.executor.submit,
+            (self.in_context, app, self.run_local, task, kwargs, attempt + 1))
+        # like the rest of the local jobs, a pending retry dies with the process
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def claim(self, id, now):
+        # queued -> running in one conditional UPDATE, only one of several
+        # racing workers gets rowcount 1
+        claimed = Job.query.filter(Job.id == id, Job.status == 'queued', Job.run_at <= now) \
+            .update({
+                Job.status: 'running',
+                Job.locked_at: now,
+                Job.attempts: Job.attempts + 1,
+            }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def run_durable(self, id):
+        """Run the durable job id if it is due and nobody else has it."""
+        while True:
+            now = datetime.datetime.now()
+            if current_app.config['JOBS_EAGER']:
+                # don't wait for the backoff, retry right away
+                Job.query.filter(Job.id == id, Job.status == 'queued') \
+                    .update({Job.run_at: now}, synchronize_session=False)
+            if not self.claim(id, now):
+                return False
+            job = Job.query.get(id)
+            task = self.tasks.get(job.name)
+            try:
+                if task is None:
+                    raise LookupError('no task registered as %r' % job.name)
+                task.func(**json.loads(job.payload))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.failed(Job.query.get(id), traceback.format_exc())
+                if current_app.config['JOBS_EAGER'] and Job.query.get(id).status == 'queued':
+                    continue
+                return False
+            # done, the table only keeps pending and failed jobs
+            Job.query.filter(Job.id == id).delete(synchronize_session=False)
+            db.session.commit()
+            return True
+
+    def failed(self, job, error):
+        current_app.logger.error('job %s #%s failed, attempt %d\n%s', job.name, job.id, job.attempts, error)
+        job.last_error = error
+        job.locked_at = None
+        if job.attempts >= current_app.config['JOBS_MAX_ATTEMPTS']:
+            job.status = 'failed'
+        else:
+            job.status = 'queued'
+            job.run_at = datetime.datetime.now() + datetime.timedelta(seconds=self.backoff(job.attempts))
+        db.session.commit()
+
+    def requeue_stale(self):
+        # running jobs whose process died before finishing
+        expired = datetime.datetime.now() - datetime.timedelta(seconds=current_app.config['JOBS_LOCK_TIMEOUT'])
+        count = Job.query.filter(Job.status == 'running', Job.locked_at < expired) \
+            .update({Job.status: 'queued', Job.locked_at: None}, synchronize_session=False)
+        db.session.commit()
+        return count
+
+    def due(self, limit):
+        ids = [id for id, in db.session.query(Job.id)
+            .filter(Job.status == 'queued', Job.run_at <= datetime.datetime.now())
+            .order_by(Job.run_at, Job.id).limit(limit)]
+        db.session.commit()
+        return ids
+
+    def work(self, once=False):
+        """Worker loop: run due jobs on the thread pool until interrupted.
+
+        With once, stop as soon as no job is due.
+        """
+        app = current_app._get_current_object()
+        size = app.config['JOBS_WORKERS']
+        done = 0
+        while True:
+            self.requeue_stale()
+            ids = self.due(size)
+            if ids:
+                results = self.executor.map(lambda id: self.in_context(app, self.run_durable, id), ids)
+                done += sum(1 for ok in results if ok)
+                continue
+            if once:
+                return done
+            time.sleep(app.config['JOBS_POLL_INTERVAL'])
+
+    def stats(self):
+        return dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status))
@@ -0,0 +1,36 @@
+"""keyset pagination indexes
+
+Revision ID: 5d8a0c3e6f21
+Revises: 9b2e4f7c1d35
+Create Date: 2026-10-18 13:26:05.772914
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8a0c3e6f21'
+down_revision = '9b2e4f7c1d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # rows without a key can't be paged by it, give them one
+    op.execute('UPDATE venues SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL')
+    op.execute('UPDATE artists SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL')
+
+    # (created_at, id) also serves ORDER BY created_at DESC LIMIT 10
+    op.drop_index('ix_venues_created_at', table_name='venues')
+    op.drop_index('ix_artists_created_at', table_name='artists')
+    op.create_index('ix_venues_created_at_id', 'venues', ['created_at', 'id'], unique=False)
+    op.create_index('ix_artists_created_at_id', 'artists', ['created_at', 'id'], unique=False)
+    op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shows_start_time_id', table_name='shows')
+    op.drop_index('ix_artists_created_at_id', table_name='artists')
+    op.drop_index('ix_venues_created_at_id', table_name='venues')
+    op.create_index('ix_artists_created_at', 'artists', ['created_at'], unique=False)
+    op.create_index('ix_venues_created_at', 'venues', ['created_at'], unique=False)
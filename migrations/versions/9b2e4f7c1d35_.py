@@ -0,0 +1,45 @@
+"""add trigram search indexes
+
+Revision ID: 9b2e4f7c1d35
+Revises: 3c1f5b2d9a47
+Create Date: 2026-10-18 11:02:47.114380
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2e4f7c1d35'
+down_revision = '3c1f5b2d9a47'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venues', 'artists')
+COLUMNS = ('name', 'city', 'state')
+
+
+def upgrade():
+    # pg_trgm GIN indexes serve the ILIKE '%term%' filters of the search views,
+    # other databases use the in-memory index from search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        for column in COLUMNS:
+            op.create_index(
+                'ix_{0}_{1}_trgm'.format(table, column), table, [column],
+                postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'}
+            )
+        op.execute(
+            "CREATE INDEX ix_{0}_city_state_trgm ON {0} "
+            "USING gin ((city || ', ' || state) gin_trgm_ops)".format(table)
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.drop_index('ix_{0}_city_state_trgm'.format(table), table_name=table)
+        for column in COLUMNS:
+            op.drop_index('ix_{0}_{1}_trgm'.format(table, column), table_name=table)
@@ -1,16 +1,73 @@
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 import datetime
+from routing import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+# reads of GET requests go to SQLALCHEMY_REPLICA_URIS when set, see routing.py
+db = RoutingSQLAlchemy()
+
+# max ids bound into a single IN (...) clause
+COUNTS_CHUNK_SIZE = 1000
+
+
+def fingerprint(*Models):
+    # (max updated_at, row count) of every model, in one round trip
+    columns = []
+    for Model in Models:
+        columns.append(db.session.query(db.func.max(Model.updated_at)).scalar_subquery())
+        columns.append(db.session.query(db.func.count(Model.id)).scalar_subquery())
+    return tuple(db.session.query(*columns).one())
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+# genre tags, the (genre_id, owner id) indexes serve "all venues in genre X"
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id')
+)
+
+class Genre(db.Model):
+    __tablename__ = 'genres'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), unique=True, nullable=False)
+
+    @classmethod
+    def named(cls, names):
+        # Genre rows for names, creating the missing ones
+        names = [n for n in dict.fromkeys(names) if n]
+        genres = {g.name: g for g in cls.query.filter(cls.name.in_(names))} if names else {}
+        for name in names:
+            if name not in genres:
+                genres[name] = cls(name=name)
+                db.session.add(genres[name])
+        return [genres[n] for n in names]
+
+    @classmethod
+    def ids(cls, names):
+        # name -> id for names, creating the missing ones
+        genres = cls.named(names)
+        db.session.flush()
+        return {g.name: g.id for g in genres}
+
+
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        # newest first on the home page, keyset pages in the API
+        db.Index('ix_venues_created_at_id', 'created_at', 'id'),
+        # the area ordered /venues listing and city filters of the calendar
+        db.Index('ix_venues_state_city_name', 'state', 'city', 'name'),
+        # most popular first
+        db.Index('ix_venues_upcoming_shows_count_id', 'upcoming_shows_count', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -25,9 +82,27 @@ class Venue(db.Model):
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(300))
-    created_at = db.Column(db.DateTime, default=datetime.datetime.now())
-    updated_at = db.Column(db.DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())    
+    # materialized show counts, see Show.bump, Show.recount and Show.roll
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)    
     shows = db.relationship('Show', backref='venues', lazy=True)
+    # normalized copy of genres, the comma-joined column is kept for display
+    genre_list = db.relationship('Genre', secondary=venue_genres, lazy=True)
+
+    def setGenres(self, names):
+        self.genres = ','.join(names)
+        self.genre_list = Genre.named(names)
+
+    @classmethod
+    def inGenre(cls, name):
+        # filter clause for venues tagged with genre name
+        return cls.id.in_(
+            db.session.query(venue_genres.c.venue_id)
+                .join(Genre, Genre.id == venue_genres.c.genre_id)
+                .filter(Genre.name == name)
+        )
     
     @property
     def toDictionary(self):
@@ -45,16 +120,32 @@ class Venue(db.Model):
             'seeking_description': self.seeking_description,
             'image_link': self.image_link
         }
+    @classmethod
+    def upcomingShowCounts(cls, ids):
+        return Show.upcomingCounts(cls, ids)
+
+    @classmethod
+    def stateCounts(cls):
+        # (state, number of venues) for every state, in one grouped query
+        return db.session.query(cls.state, db.func.count(cls.id)) \
+            .group_by(cls.state).order_by(cls.state).all()
+
     @property
     def withUpcomingShows(self):
         return {
             'id': self.id,
             'name': self.name,
-            'num_upcoming_shows': Show.query.filter(Show.start_time > datetime.datetime.now(),Show.venue_id == self.id).count()
+            'num_upcoming_shows': self.upcoming_shows_count
         }
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        # newest first on the home page, keyset pages in the API
+        db.Index('ix_artists_created_at_id', 'created_at', 'id'),
+        # most popular first
+        db.Index('ix_artists_upcoming_shows_count_id', 'upcoming_shows_count', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -70,9 +161,27 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String(300))
     available_from_date = db.Column(db.DateTime(), nullable=True)
     available_to_date = db.Column(db.DateTime(), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.datetime.now())
-    updated_at = db.Column(db.DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
+    # materialized show counts, see Show.bump, Show.recount and Show.roll
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     shows = db.relationship('Show', backref='artists', lazy=True)
+    # normalized copy of genres, the comma-joined column is kept for display
+    genre_list = db.relationship('Genre', secondary=artist_genres, lazy=True)
+
+    def setGenres(self, names):
+        self.genres = ','.join(names)
+        self.genre_list = Genre.named(names)
+
+    @classmethod
+    def inGenre(cls, name):
+        # filter clause for artists tagged with genre name
+        return cls.id.in_(
+            db.session.query(artist_genres.c.artist_id)
+                .join(Genre, Genre.id == artist_genres.c.genre_id)
+                .filter(Genre.name == name)
+        )
 
     @property
     def toDictionary(self):
@@ -89,37 +198,270 @@ class Artist(db.Model):
             'seeking_description': self.seeking_description,
             'image_link': self.image_link
         }
+    @classmethod
+    def upcomingShowCounts(cls, ids):
+        return Show.upcomingCounts(cls, ids)
+
     @property
     def withUpcomingShows(self):
         return {
             'id': self.id,
             'name': self.name,
-            'num_upcoming_shows': Show.query.filter(Show.start_time > datetime.datetime.now(),Show.artist_id == self.id).count()
+            'num_upcoming_shows': self.upcoming_shows_count
         }
     @property
     def isAvailable(self):
-        if not self.available_from_date and not self.available_to_date:
-            return True
-        return True if (self.available_from_date < datetime.datetime.now() and self.available_to_date > datetime.datetime.now()) else False
+        return self.isAvailableAt(datetime.datetime.now())
+
+    def isAvailableAt(self, when):
+        if self.available_from_date and when < self.available_from_date:
+            return False
+        if self.available_to_date and when > self.available_to_date:
+            return False
+        return True
+
+    @property
+    def availability(self):
+        return 'from {0} to {1}'.format(
+            self.available_from_date.strftime("%Y-%m-%d %H:%M:%S") if self.available_from_date else 'any time',
+            self.available_to_date.strftime("%Y-%m-%d %H:%M:%S") if self.available_to_date else 'any time'
+        )
 
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        # detail pages and upcoming counts filter by one side plus a start_time range
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        # keyset pages in the API
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime())
-    created_at = db.Column(db.DateTime, default=datetime.datetime.now())
-    updated_at = db.Column(db.DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+
+    @staticmethod
+    def upcomingCounts(Owner, ids):
+        # materialized upcoming shows per venue or artist id,
+        # one primary key lookup per chunk of ids
+        ids = list(ids)
+        counts = {}
+        for i in range(0, len(ids), COUNTS_CHUNK_SIZE):
+            counts.update(db.session.query(Owner.id, Owner.upcoming_shows_count)
+                .filter(Owner.id.in_(ids[i:i + COUNTS_CHUNK_SIZE])))
+        return counts
+
+    @staticmethod
+    def bump(venue_id, artist_id, start_time, delta=1, now=None):
+        # count a show in (delta=1) or out (delta=-1) of its venue's and
+        # artist's counters, an atomic increment on both rows
+        now = now or datetime.datetime.now()
+        name = 'upcoming_shows_count' if start_time > now else 'past_shows_count'
+        for Owner, id in ((Venue, venue_id), (Artist, artist_id)):
+            column = getattr(Owner, name)
+            Owner.query.filter(Owner.id == id).update({column: column + delta}, synchronize_session=False)
+
+    @staticmethod
+    def recount(Owner, ids=None, now=None):
+        # recompute the counters of venues or artists, all of them by default,
+        # with correlated counts over the (owner id, start_time) index
+        now = now or datetime.datetime.now()
+        column = getattr(Show, Owner.__name__.lower() + '_id')
+        def count(*filters):
+            return db.session.query(db.func.count(Show.id)) \
+                .filter(column == Owner.id, *filters).correlate(Owner).scalar_subquery()
+        values = {
+            Owner.upcoming_shows_count: count(Show.start_time > now),
+            Owner.past_shows_count: count(Show.start_time <= now),
+        }
+        if ids is None:
+            return Owner.query.update(values, synchronize_session=False)
+        ids = list(ids)
+        updated = 0
+        for i in range(0, len(ids), COUNTS_CHUNK_SIZE):
+            updated += Owner.query.filter(Owner.id.in_(ids[i:i + COUNTS_CHUNK_SIZE])) \
+                .update(values, synchronize_session=False)
+        return updated
 
-    def shows(self, Model):
+    @staticmethod
+    def roll(since, now=None):
+        # shows starting in (since, now] went from upcoming to past, recount
+        # their venues and artists; a recount is idempotent, so overlapping
+        # windows are harmless
+        now = now or datetime.datetime.now()
+        venue_ids, artist_ids = set(), set()
+        for venue_id, artist_id in db.session.query(Show.venue_id, Show.artist_id) \
+                .filter(Show.start_time > since, Show.start_time <= now):
+            venue_ids.add(venue_id)
+            artist_ids.add(artist_id)
+        Show.recount(Venue, venue_ids, now)
+        Show.recount(Artist, artist_ids, now)
+        return venue_ids, artist_ids
+
+    @staticmethod
+    def listing():
+        # shows joined with their venue and artist in one query,
+        # selecting only the columns pages/shows.html renders
+        return db.session.query(
+            Show.id,
+            Show.start_time,
+            Venue.id.label('venue_id'),
+            Venue.name.label('venue_name'),
+            Artist.id.label('artist_id'),
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+        ).join(Venue, Venue.id == Show.venue_id) \
+         .join(Artist, Artist.id == Show.artist_id) \
+         .order_by(Show.start_time, Show.id)
+
+    @staticmethod
+    def schedule(Model, column, id, past_page=1, per_page=30, now=None):
+        # upcoming and past shows of one venue or artist with their Model
+        # counterpart, in a single query ordered by start_time newest first;
+        # a window count gives the size of each side without a second query
+        now = now or datetime.datetime.now()
         model_name = Model.__name__.lower()
-        model = Model.query.get(getattr(self, model_name + '_id'))
-        return {
-            model_name + "_id": model.id,
-            model_name + "_name": model.name + ' ' + Model.__name__,
-            model_name + "_image_link": model.image_link,
-            "start_time": self.start_time.strftime("%Y-%m-%d %H:%M:%S")
+        is_upcoming = Show.start_time > now
+        query = db.session.query(
+            Show.start_time,
+            Model.id,
+            Model.name,
+            Model.image_link,
+            db.func.count(Show.id).over(partition_by=is_upcoming)
+        ).join(Model, Model.id == getattr(Show, model_name + '_id')) \
+         .filter(column == id, Show.start_time.isnot(None)) \
+         .order_by(Show.start_time.desc(), Show.id.desc())
+
+        data = {
+            'upcoming_shows': [],
+            'upcoming_shows_count': 0,
+            'past_shows': [],
+            'past_shows_count': 0,
         }
+        skip = (past_page - 1) * per_page
+        for start_time, model_id, name, image_link, count in query.yield_per(per_page):
+            show = {
+                model_name + "_id": model_id,
+                model_name + "_name": name + ' ' + Model.__name__,
+                model_name + "_image_link": image_link,
+                "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S")
+            }
+            if start_time > now:
+                data['upcoming_shows'].append(show)
+                data['upcoming_shows_count'] = count
+                continue
+            # past shows come last, stop reading once the page is full
+            data['past_shows_count'] = count
+            if skip:
+                skip -= 1
+                continue
+            data['past_shows'].append(show)
+            if len(data['past_shows']) >= per_page:
+                break
+        # soonest upcoming show first
+        data['upcoming_shows'].reverse()
+        return data
+
+    @staticmethod
+    def scheduleFingerprint(Owner, Model, column, id, now=None):
+        # everything Show.schedule() output depends on: the owner row, its
+        # shows, their Model counterparts and the latest show that already
+        # started (shows move from upcoming to past as time passes)
+        now = now or datetime.datetime.now()
+        model_name = Model.__name__.lower()
+        owner_updated = db.session.query(Owner.updated_at).filter(Owner.id == id).scalar_subquery()
+        return tuple(db.session.query(
+            owner_updated,
+            db.func.max(Show.updated_at),
+            db.func.max(Model.updated_at),
+            db.func.count(Show.id),
+            db.func.max(db.case([(Show.start_time <= now, Show.start_time)]))
+        ).select_from(Show) \
+         .join(Model, Model.id == getattr(Show, model_name + '_id')) \
+         .filter(column == id).one())
+
+    @staticmethod
+    def conflicts(venue_id, artist_id, start_time, duration):
+        # shows of the venue or of the artist overlapping
+        # [start_time, start_time + duration); every show lasts duration, so
+        # those start less than one duration away, a range seek on each of
+        # the (venue_id, start_time) and (artist_id, start_time) indexes
+        return Show.query.filter(
+            db.or_(Show.venue_id == venue_id, Show.artist_id == artist_id),
+            Show.start_time > start_time - duration,
+            Show.start_time < start_time + duration
+        )
+
+    @staticmethod
+    def calendar(start, end, city=None, state=None):
+        # shows in [start, end), optionally only at venues of one city,
+        # as one range scan on start_time joined to venues
+        query = Show.listing().filter(Show.start_time >= start, Show.start_time < end)
+        if state:
+            query = query.filter(Venue.state == state)
+        if city:
+            query = query.filter(Venue.city == city)
+        return query
+
+class Recommendation(db.Model):
+    __tablename__ = 'recommendations'
+    __table_args__ = (
+        # best matches of one venue, read in score order
+        db.Index('ix_recommendations_venue_id_score', 'venue_id', 'score'),
+        # rows to replace when an artist changes
+        db.Index('ix_recommendations_artist_id', 'artist_id'),
+    )
+
+    # precomputed artist matches of venues seeking talent, see recommendations.py
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.datetime.now, nullable=False)
 
+    @staticmethod
+    def forVenue(venue_id, limit):
+        # best scored artists of a venue, one index range read
+        return db.session.query(
+            Artist.id,
+            Artist.name,
+            Artist.image_link,
+            Artist.city,
+            Artist.state,
+            Recommendation.score
+        ).join(Artist, Artist.id == Recommendation.artist_id) \
+         .filter(Recommendation.venue_id == venue_id) \
+         .order_by(Recommendation.score.desc(), Artist.id) \
+         .limit(limit)
 
+    @staticmethod
+    def fingerprint(venue_id):
+        # (last refresh, number of matches) of a venue
+        return tuple(db.session.query(
+            db.func.max(Recommendation.computed_at),
+            db.func.count(Recommendation.artist_id)
+        ).filter(Recommendation.venue_id == venue_id).one())
 
+
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # due jobs in the order workers pick them up
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    # durable background work, see jobs.py
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
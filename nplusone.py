@@ -0,0 +1,126 @@
+import os
+import re
+import traceback
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# N+1 query detector.
+#
+# Every statement a request runs is reduced to its shape (literals and
+# placeholders replaced, IN lists collapsed) and counted. A shape run more
+# than NPLUSONE_THRESHOLD times in one request is the sign of a per-row
+# lazy load or Model.query.get in a loop. The detector then
+#   - logs a warning with the call site of the repeated query in debug mode
+#   - raises NPlusOneError at the end of the request under tests
+#     (NPLUSONE_RAISE, on with TESTING)
+# It is off in production unless NPLUSONE_ENABLED says otherwise.
+#
+# Statements run by a streamed response are counted too, but the request
+# is over by then and they are only logged.
+#----------------------------------------------------------------------------#
+
+# the application's own files, call sites are searched among them
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDERS = re.compile(r'%\(\w+\)s|%s|:\w+|\?')
+LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACES = re.compile(r'\s+')
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def shape(statement):
+    """Statement with literals and parameters replaced by ?, so every run
+    of the same query has the same shape whatever its arguments."""
+    statement = STRINGS.sub('?', statement)
+    statement = PLACEHOLDERS.sub('?', statement)
+    statement = NUMBERS.sub('?', statement)
+    statement = LISTS.sub('(?)', statement)
+    return SPACES.sub(' ', statement).strip()
+
+
+def call_site():
+    # innermost frame of the application itself, outside this module
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith('<'):
+            # code generated at runtime, e.g. SQLAlchemy's deprecation wrappers
+            continue
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(ROOT + os.sep) and filename != os.path.abspath(__file__) \
+                and os.sep + 'site-packages' + os.sep not in filename:
+            return '%s:%d in %s' % (os.path.relpath(filename, ROOT), frame.lineno, frame.name)
+    return 'unknown'
+
+
+class QueryGuard(object):
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('NPLUSONE_ENABLED', app.debug or app.testing)
+        app.config.setdefault('NPLUSONE_RAISE', app.testing)
+        app.config.setdefault('NPLUSONE_THRESHOLD', 10)
+        if not app.config['NPLUSONE_ENABLED']:
+            return
+        listen_engine()
+        app.before_request(self.started)
+        app.after_request(self.finished)
+
+    @staticmethod
+    def started():
+        g.query_shapes = {'counts': {}, 'repeated': {}, 'open': True}
+
+    @staticmethod
+    def finished(response):
+        shapes = g.get('query_shapes')
+        if shapes is None:
+            return response
+        # statements of a streamed body come after this, see record()
+        shapes['open'] = False
+        if shapes['repeated'] and current_app.config['NPLUSONE_RAISE']:
+            raise NPlusOneError(report(shapes))
+        return response
+
+
+def report(shapes):
+    return 'N+1 queries, %s' % '; '.join(
+        '%d x %s at %s' % (shapes['counts'][statement], statement, site)
+        for statement, site in shapes['repeated'].items())
+
+
+def record(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    shapes = g.get('query_shapes')
+    if shapes is None:
+        return
+    statement = shape(statement)
+    count = shapes['counts'].get(statement, 0) + 1
+    shapes['counts'][statement] = count
+    if count != current_app.config['NPLUSONE_THRESHOLD'] + 1:
+        return
+    # the first run over the threshold, once per shape and request
+    site = call_site()
+    shapes['repeated'][statement] = site
+    if not current_app.config['NPLUSONE_RAISE'] or not shapes['open']:
+        current_app.logger.warning('N+1 query, run more than %d times in one request: %s at %s',
+            current_app.config['NPLUSONE_THRESHOLD'], statement, site)
+
+
+_listening = []
+
+
+def listen_engine():
+    # once per process, like the instrumentation listeners
+    if _listening:
+        return
+    _listening.append(True)
+    event.listen(Engine, 'before_cursor_execute', record)
@@ -0,0 +1,140 @@
+import datetime
+from sqlalchemy import func
+from models import db, Venue, Artist, Recommendation, COUNTS_CHUNK_SIZE, venue_genres, artist_genres
+
+#----------------------------------------------------------------------------#
+# Artist recommendations for venues seeking talent.
+#
+# Every venue seeking talent is paired with the artists seeking a venue that
+# share at least one of its genres. A pair is scored on
+#   genre overlap   shared genres / genres of either side (Jaccard)
+#   location        same city, or at least the same state
+#   availability    the artist is available now, or only later on
+# and stored in the recommendations table, so pages and the API read the
+# best matches of a venue with one index range scan.
+#
+# The rows of a venue or an artist are recomputed when it is created or
+# edited (refresh_venue / refresh_artist, from the candidates sharing a
+# genre only). Availability moves with time and bulk imports bypass the
+# views, `flask recommendations rebuild` recomputes the whole table.
+#----------------------------------------------------------------------------#
+
+GENRE_WEIGHT = 0.6
+LOCATION_WEIGHT = 0.3
+AVAILABILITY_WEIGHT = 0.1
+
+
+def genre_counts(column, ids):
+    # number of genres per venue or artist id, one GROUP BY per chunk of ids
+    ids = list(ids)
+    counts = {}
+    for i in range(0, len(ids), COUNTS_CHUNK_SIZE):
+        rows = db.session.query(column, func.count()) \
+            .filter(column.in_(ids[i:i + COUNTS_CHUNK_SIZE])) \
+            .group_by(column)
+        counts.update(rows)
+    return counts
+
+
+def candidates(*filters):
+    # (venue, artist, shared genres) of seeking venues and artists with a
+    # genre in common, joined through the (genre_id, owner id) indexes
+    return db.session.query(
+        Venue.id.label('venue_id'),
+        Venue.city.label('venue_city'),
+        Venue.state.label('venue_state'),
+        Artist.id.label('artist_id'),
+        Artist.city.label('artist_city'),
+        Artist.state.label('artist_state'),
+        Artist.available_from_date,
+        Artist.available_to_date,
+        func.count().label('shared')
+    ).select_from(venue_genres) \
+     .join(artist_genres, artist_genres.c.genre_id == venue_genres.c.genre_id) \
+     .join(Venue, Venue.id == venue_genres.c.venue_id) \
+     .join(Artist, Artist.id == artist_genres.c.artist_id) \
+     .filter(Venue.seeking_talent == True, Artist.seeking_venue == True, *filters) \
+     .group_by(
+        Venue.id, Venue.city, Venue.state,
+        Artist.id, Artist.city, Artist.state,
+        Artist.available_from_date, Artist.available_to_date
+     )
+
+
+def location_score(row):
+    if not row.venue_state or row.venue_state.lower() != (row.artist_state or '').lower():
+        return 0.0
+    if row.venue_city and row.venue_city.lower() == (row.artist_city or '').lower():
+        return 1.0
+    return 0.5
+
+
+def availability_score(row, now):
+    # None when the availability window is over, the artist can't be booked
+    if row.available_to_date and row.available_to_date < now:
+        return None
+    if row.available_from_date and row.available_from_date > now:
+        return 0.5
+    return 1.0
+
+
+def scored(rows, now=None):
+    """Recommendation rows (dictionaries) for candidates() rows."""
+    now = now or datetime.datetime.now()
+    rows = rows.all()
+    venue_counts = genre_counts(venue_genres.c.venue_id, set(r.venue_id for r in rows))
+    artist_counts = genre_counts(artist_genres.c.artist_id, set(r.artist_id for r in rows))
+    for row in rows:
+        availability = availability_score(row, now)
+        if availability is None:
+            continue
+        genres = venue_counts[row.venue_id] + artist_counts[row.artist_id] - row.shared
+        score = GENRE_WEIGHT * row.shared / genres \
+            + LOCATION_WEIGHT * location_score(row) \
+            + AVAILABILITY_WEIGHT * availability
+        yield {
+            'venue_id': row.venue_id,
+            'artist_id': row.artist_id,
+            'score': round(score, 4),
+            'computed_at': now,
+        }
+
+
+def store(rows):
+    rows = list(rows)
+    if rows:
+        db.session.execute(Recommendation.__table__.insert(), rows)
+    return len(rows)
+
+
+def refresh_venue(venue_id):
+    """Recompute the matches of one venue, in the current transaction."""
+    Recommendation.query.filter_by(venue_id=venue_id).delete(synchronize_session=False)
+    return store(scored(candidates(Venue.id == venue_id)))
+
+
+def refresh_artist(artist_id):
+    """Recompute the matches of one artist, in the current transaction.
+
+    Returns the ids of the venues whose recommendations changed.
+    """
+    venue_ids = set(venues_recommending(artist_id))
+    Recommendation.query.filter_by(artist_id=artist_id).delete(synchronize_session=False)
+    rows = list(scored(candidates(Artist.id == artist_id)))
+    store(rows)
+    return venue_ids.union(r['venue_id'] for r in rows)
+
+
+def rebuild(batch_size=1000):
+    """Recompute the whole table, batch_size venues at a time."""
+    Recommendation.query.delete(synchronize_session=False)
+    venue_ids = [v for v, in db.session.query(Venue.id).filter(Venue.seeking_talent == True).order_by(Venue.id)]
+    total = 0
+    for i in range(0, len(venue_ids), batch_size):
+        total += store(scored(candidates(Venue.id.in_(venue_ids[i:i + batch_size]))))
+    return total
+
+
+def venues_recommending(artist_id):
+    # venues listing an artist among their matches
+    return [v for v, in db.session.query(Recommendation.venue_id).filter_by(artist_id=artist_id)]
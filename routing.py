@@ -0,0 +1,163 @@
+import random
+import threading
+import time
+from flask import current_app, has_request_context, request, session as cookie
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm, text
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# With SQLALCHEMY_REPLICA_URIS set, the session sends the reads of GET and
+# HEAD requests to a replica and everything else to the primary:
+#   - flushes, INSERT/UPDATE/DELETE and SELECT ... FOR UPDATE; after the
+#     first of them the rest of the request stays on the primary too
+#   - requests with another method, commands and background jobs
+#   - GETs within REPLICA_LAG_TOLERANCE seconds of a write by the same
+#     browser (a timestamp in the session cookie, set by requests that
+#     committed a flush or an INSERT/UPDATE/DELETE), so the page a form
+#     redirects to shows what was just written
+# A request reads from one replica, picked at random among the healthy
+# ones. Replicas are checked at most every REPLICA_CHECK_INTERVAL seconds:
+# one that fails the check or lags more than REPLICA_LAG_TOLERANCE is left
+# out until the next check, and with no replica left reads go back to the
+# primary.
+#
+# Replicas are Flask-SQLAlchemy binds named replica0, replica1... so they
+# share the engine options of the primary. To try it locally, copy a
+# SQLite database and point a replica at the copy:
+#   SQLALCHEMY_REPLICA_URIS = ['sqlite:////tmp/fyyur-replica.db']
+#----------------------------------------------------------------------------#
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+# seconds the replica is behind; on PostgreSQL a replica that replayed all
+# it received is not behind, however old its last transaction is
+LAG_QUERIES = {
+    'postgresql': """
+        SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+    """,
+}
+
+WROTE_AT = 'wrote_at'
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        self.db = db
+        # replica engine of this session, False once none was available
+        self.replica = None
+        # stays on the primary after its first write
+        self.pinned = False
+        # written in the open transaction, and written and committed
+        self.pending = False
+        self.wrote = False
+        SignallingSession.__init__(self, db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or getattr(clause, 'is_dml', False):
+            self.pending = True
+        bind = SignallingSession.get_bind(self, mapper, clause)
+        if bind is not self.bind or not self.db.replicas(self.app):
+            # models with a __bind_key__ of their own, or no replicas
+            return bind
+        if self.pinned or self.writes(clause):
+            self.pinned = True
+            return bind
+        if not reads_allowed(self.app):
+            return bind
+        if self.replica is None:
+            self.replica = self.db.pick_replica(self.app) or False
+        return self.replica or bind
+
+    def writes(self, clause):
+        return self._flushing or getattr(clause, 'is_dml', False) \
+            or getattr(clause, '_for_update_arg', None) is not None
+
+    def commit(self):
+        SignallingSession.commit(self)
+        self.wrote = self.wrote or self.pending
+        self.pending = False
+
+    def rollback(self):
+        SignallingSession.rollback(self)
+        self.pending = False
+
+
+def wrote_recently(app):
+    # this browser wrote less than REPLICA_LAG_TOLERANCE seconds ago
+    wrote_at = cookie.get(WROTE_AT)
+    return wrote_at is not None and time.time() - wrote_at < app.config['REPLICA_LAG_TOLERANCE']
+
+
+def reads_allowed(app):
+    if not has_request_context() or request.method not in SAFE_METHODS:
+        return False
+    return not wrote_recently(app)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy with a session that reads from replicas, see above."""
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('REPLICA_LAG_TOLERANCE', 5)
+        app.config.setdefault('REPLICA_CHECK_INTERVAL', 10)
+        names = []
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        for index, uri in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+            names.append('replica%d' % index)
+            binds[names[-1]] = uri
+        if names:
+            app.config['SQLALCHEMY_BINDS'] = binds
+        app.extensions['replicas'] = {
+            'lock': threading.Lock(),
+            # bind name -> (healthy, lag, checked at)
+            'checks': dict((name, (True, 0.0, 0.0)) for name in names),
+        }
+        SQLAlchemy.init_app(self, app)
+        app.after_request(self.mark_writes)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def replicas(self, app):
+        return app.extensions['replicas']['checks']
+
+    def pick_replica(self, app):
+        healthy = [name for name in sorted(self.replicas(app)) if self.check(app, name)]
+        if not healthy:
+            return None
+        return self.get_engine(app, bind=random.choice(healthy))
+
+    def check(self, app, name):
+        state = app.extensions['replicas']
+        healthy, lag, checked = state['checks'][name]
+        now = time.time()
+        if now - checked < app.config['REPLICA_CHECK_INTERVAL']:
+            return healthy
+        engine = self.get_engine(app, bind=name)
+        try:
+            with engine.connect() as conn:
+                lag = float(conn.execute(text(LAG_QUERIES.get(engine.dialect.name, 'SELECT 0'))).scalar() or 0)
+            healthy = lag <= app.config['REPLICA_LAG_TOLERANCE']
+            if not healthy:
+                app.logger.warning('replica %s is %.1fs behind, reading from the primary', name, lag)
+        except Exception as e:
+            app.logger.warning('replica %s is unavailable, reading from the primary: %s', name, e)
+            healthy = False
+        with state['lock']:
+            state['checks'][name] = (healthy, lag, now)
+        return healthy
+
+    def mark_writes(self, response):
+        # after_request: the next reads of this browser go to the primary
+        # until the replicas caught up with this request's writes; a POST
+        # that only read, like a search, leaves the cookie alone
+        if not self.replicas(current_app):
+            return response
+        if self.session.registry.has() and self.session().wrote:
+            cookie[WROTE_AT] = time.time()
+        return response
@@ -0,0 +1,330 @@
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import or_, func
+from models import db, fingerprint
+
+#----------------------------------------------------------------------------#
+# Search.
+#
+# PostgreSQL answers venue and artist searches through pg_trgm GIN indexes
+# (see migration 9b2e4f7c1d35) and ranks them with similarity(). Other
+# databases, SQLite in local and test runs, use an in-memory trigram index
+# that is built on first use and kept current by the write views.
+#
+# Autocomplete is served from a sorted in-memory prefix index over names and
+# "City, ST" strings, lookups never touch the database. wsgi.py builds it
+# at startup, before gunicorn forks; other processes answer nothing until
+# their first refresh() ran.
+#
+# Every process holds its own indexes and the write views only update the
+# ones of the process that served them. So at most every
+# SEARCH_CHECK_INTERVAL seconds a lookup schedules refresh() as a local
+# job, which compares the fingerprint of the venues and artists tables (max
+# updated_at, row count) with the one the indexes reflect, and rebuilds
+# and swaps them in once another process, another server worker or
+# `flask import`, changed the tables.
+#----------------------------------------------------------------------------#
+
+WORD = re.compile(r'[^\W_]+', re.UNICODE)
+
+# a search result, shaped like the (id, name) rows of the PostgreSQL path
+Match = namedtuple('Match', ['id', 'name'])
+
+
+def trigrams(value):
+    # pg_trgm style trigrams: lower-cased words padded with two spaces in
+    # front and one behind
+    grams = set()
+    for word in WORD.findall((value or '').lower()):
+        padded = '  ' + word + ' '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    return overlap(trigrams(a), trigrams(b))
+
+
+def overlap(a, b):
+    # similarity() of two precomputed trigram sets
+    if not a or not b:
+        return 0.0
+    # no union set built, its size follows from the intersection
+    common = len(a & b)
+    return common / float(len(a) + len(b) - common)
+
+
+def windows(value):
+    # every 3 character slice, a substring of value has all of its own slices in here
+    return set(value[i:i + 3] for i in range(len(value) - 2))
+
+
+class TrigramIndex(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.postings = {}
+
+    def add(self, id, name, city, state):
+        with self.lock:
+            self.discard(id)
+            fields = tuple((f or '').lower() for f in (name, city, state))
+            # the trigrams of every field, scored against each query term
+            self.entries[id] = (name or '', fields, tuple(trigrams(f) for f in fields))
+            for gram in self.keys(fields):
+                self.postings.setdefault(gram, set()).add(id)
+
+    def remove(self, id):
+        with self.lock:
+            self.discard(id)
+
+    def discard(self, id):
+        entry = self.entries.pop(id, None)
+        if entry is None:
+            return
+        for gram in self.keys(entry[1]):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self.postings[gram]
+
+    @staticmethod
+    def keys(fields):
+        name, city, state = fields
+        return windows(name) | windows(city) | windows(state) | windows(city + ', ' + state)
+
+    def candidates(self, term):
+        grams = windows(term)
+        if not grams:
+            return list(self.entries)
+        # intersect posting lists, smallest first
+        postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+        ids = set(postings[0])
+        for other in postings[1:]:
+            ids &= other
+            if not ids:
+                break
+        return ids
+
+    def search(self, term, limit, offset=0, allowed=None):
+        term = term.lower()
+        grams = trigrams(term)
+        with self.lock:
+            # copy the candidate rows, scoring runs outside the lock
+            candidates = self.candidates(term)
+            if allowed is not None:
+                candidates = allowed.intersection(candidates)
+            rows = [(id, self.entries[id]) for id in candidates if id in self.entries]
+        matches = []
+        for id, (name, (lname, city, state), fields) in rows:
+            if term in lname or term in city or term in state or (city + ', ' + state).startswith(term):
+                score = max(overlap(grams, field) for field in fields)
+                matches.append((-score, lname, id, name))
+        matches.sort()
+        return len(matches), [Match(id, name) for _, _, id, name in matches[offset:offset + limit]]
+
+
+class PrefixIndex(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # sorted (key, kind, id) tuples, binary searched by prefix
+        self.keys = []
+        self.entries = {}
+
+    def add(self, kind, id, name, city, state):
+        with self.lock:
+            self.discard(kind, id)
+            keys = set([(name or '').lower(), '{0}, {1}'.format(city, state).lower()])
+            for key in keys:
+                insort(self.keys, (key, kind, id))
+            self.entries[(kind, id)] = (name, '{0}, {1}'.format(city, state), keys)
+
+    def remove(self, kind, id):
+        with self.lock:
+            self.discard(kind, id)
+
+    def discard(self, kind, id):
+        entry = self.entries.pop((kind, id), None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            i = bisect_left(self.keys, (key, kind, id))
+            if i < len(self.keys) and self.keys[i] == (key, kind, id):
+                del self.keys[i]
+
+    def complete(self, prefix, k=10):
+        prefix = prefix.lower()
+        results = []
+        seen = set()
+        with self.lock:
+            for i in range(bisect_left(self.keys, (prefix,)), len(self.keys)):
+                key, kind, id = self.keys[i]
+                if not key.startswith(prefix) or len(results) >= k:
+                    break
+                if (kind, id) in seen:
+                    continue
+                seen.add((kind, id))
+                name, location, _ = self.entries[(kind, id)]
+                results.append({'type': kind, 'id': id, 'name': name, 'location': location})
+        return results
+
+
+class Search(object):
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_CHECK_INTERVAL', 5)
+        app.extensions['search'] = {
+            'lock': threading.Lock(),
+            # held by the refresh() at work, others skip theirs
+            'building': threading.Lock(),
+            # fallback indexes, keyed by model and built on first use
+            'indexes': {},
+            'autocomplete': None,
+            # fingerprint of the tables the indexes reflect
+            'version': None,
+            'checked': 0.0,
+        }
+
+    @property
+    def state(self):
+        return current_app.extensions['search']
+
+    def due(self):
+        """Whether the indexes are due for a check against the tables.
+
+        Reads memory only; the caller schedules refresh() off the request
+        path when this returns True, at most once per SEARCH_CHECK_INTERVAL.
+        """
+        state = self.state
+        now = time.time()
+        with state['lock']:
+            if now - state['checked'] < current_app.config['SEARCH_CHECK_INTERVAL']:
+                return False
+            state['checked'] = now
+            return True
+
+    def refresh(self):
+        """Build the indexes, or rebuild them if venues or artists changed since."""
+        from models import Venue, Artist
+        state = self.state
+        if not state['building'].acquire(False):
+            return
+        try:
+            state['checked'] = time.time()
+            version = fingerprint(Venue, Artist)
+            if state['autocomplete'] is not None and version == state['version']:
+                return
+            # built aside and swapped in whole, lookups keep reading the
+            # old indexes meanwhile
+            autocomplete = self.build_autocomplete()
+            indexes = dict((Model, self.build(Model)) for Model in list(state['indexes']))
+            with state['lock']:
+                state['version'] = version
+                state['autocomplete'] = autocomplete
+                state['indexes'] = indexes
+        finally:
+            state['building'].release()
+
+    def build_autocomplete(self):
+        from models import Venue, Artist
+        index = PrefixIndex()
+        # sorted once at the end, add() and its insort are for single rows
+        for Model in (Venue, Artist):
+            kind = Model.__name__.lower()
+            for id, name, city, state in db.session.query(Model.id, Model.name, Model.city, Model.state):
+                location = '{0}, {1}'.format(city, state)
+                keys = set([(name or '').lower(), location.lower()])
+                index.keys.extend((key, kind, id) for key in keys)
+                index.entries[(kind, id)] = (name, location, keys)
+        index.keys.sort()
+        return index
+
+    def complete(self, prefix, k=10):
+        """Top k venues and artists whose name or "City, ST" starts with prefix."""
+        index = self.state['autocomplete']
+        if index is None:
+            # not built yet, see refresh()
+            return []
+        return index.complete(prefix, k)
+
+    def query(self, Model, term, limit, offset=0, genre=None):
+        """Return (total matches, [(id, name), ...]) for one page of results."""
+        if db.engine.dialect.name == 'postgresql':
+            return self.query_postgres(Model, term, limit, offset, genre)
+        index = self.state['indexes'].get(Model)
+        if index is None:
+            # once per model, this request reads the database anyway
+            index = self.state['indexes'][Model] = self.build(Model)
+        allowed = None
+        if genre:
+            allowed = set(id for id, in db.session.query(Model.id).filter(Model.inGenre(genre)))
+        return index.search(term, limit, offset, allowed)
+
+    def query_postgres(self, Model, term, limit, offset, genre=None):
+        pattern = '%' + term + '%'
+        # search by name or state or city or city with state
+        query = db.session.query(Model.id, Model.name).filter(or_(
+            Model.name.ilike(pattern),
+            Model.state.ilike(pattern),
+            Model.city.ilike(pattern),
+            (Model.city + ', ' + Model.state).ilike(term + '%')
+        ))
+        if genre:
+            query = query.filter(Model.inGenre(genre))
+        total = query.count()
+        score = func.greatest(
+            func.similarity(Model.name, term),
+            func.similarity(Model.city, term),
+            func.similarity(Model.state, term)
+        )
+        rows = query.order_by(score.desc(), Model.name, Model.id).limit(limit).offset(offset).all()
+        return total, rows
+
+    def build(self, Model):
+        index = TrigramIndex()
+        for row in db.session.query(Model.id, Model.name, Model.city, Model.state):
+            index.add(*row)
+        return index
+
+    def add(self, obj):
+        # this process sees its own writes right away, the others on their
+        # next refresh
+        kind, version = type(obj), self.written()
+        with self.state['lock']:
+            autocomplete, index = self.state['autocomplete'], self.state['indexes'].get(kind)
+            if autocomplete is not None:
+                autocomplete.add(kind.__name__.lower(), obj.id, obj.name, obj.city, obj.state)
+            # keep an already built fallback index current, no-op otherwise
+            if index is not None:
+                index.add(obj.id, obj.name, obj.city, obj.state)
+            self.state['version'] = version
+
+    def remove(self, Model, id):
+        version = self.written()
+        with self.state['lock']:
+            autocomplete, index = self.state['autocomplete'], self.state['indexes'].get(Model)
+            if autocomplete is not None:
+                autocomplete.remove(Model.__name__.lower(), int(id))
+            if index is not None:
+                index.remove(int(id))
+            self.state['version'] = version
+
+    def written(self):
+        # add() and remove() run in local jobs after the write committed;
+        # the fingerprint taken now includes it, so the next check doesn't
+        # rebuild for a write these indexes already have. A write another
+        # process committed just before is then picked up with the next
+        # change of the tables.
+        from models import Venue, Artist
+        return fingerprint(Venue, Artist)
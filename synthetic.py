@@ -0,0 +1,235 @@
+import datetime
+import random
+from itertools import accumulate
+from forms import VenueForm
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#
+# Deterministic venues, artists and shows for benchmarks and local testing:
+# the same seed and day give the same records. They are shaped like the
+# real catalog:
+#   - cities weighted by the size of their music scene, so a few states and
+#     cities hold most venues and artists
+#   - a few popular genres on most venues and artists, one to three each
+#   - a few busy venues and touring artists play most shows, artists mostly
+#     play in their own state
+#   - shows a year back and half a year ahead of today, in the evening and
+#     more often on weekends
+# Records are plain dictionaries in the format `flask import` reads; shows
+# reference their venue and artist by name, every generated name is unique.
+#----------------------------------------------------------------------------#
+
+# (city, state, weight)
+CITIES = [
+    ('New York', 'NY', 20),
+    ('Los Angeles', 'CA', 16),
+    ('Chicago', 'IL', 10),
+    ('Nashville', 'TN', 9),
+    ('Austin', 'TX', 9),
+    ('San Francisco', 'CA', 8),
+    ('Seattle', 'WA', 6),
+    ('New Orleans', 'LA', 6),
+    ('Atlanta', 'GA', 5),
+    ('Boston', 'MA', 5),
+    ('Brooklyn', 'NY', 5),
+    ('Denver', 'CO', 4),
+    ('Portland', 'OR', 4),
+    ('Philadelphia', 'PA', 4),
+    ('Oakland', 'CA', 3),
+    ('Minneapolis', 'MN', 3),
+    ('Detroit', 'MI', 3),
+    ('Houston', 'TX', 3),
+    ('Miami', 'FL', 3),
+    ('Memphis', 'TN', 2),
+    ('San Diego', 'CA', 2),
+    ('Kansas City', 'MO', 2),
+    ('Columbus', 'OH', 1),
+    ('Las Vegas', 'NV', 1),
+    ('Salt Lake City', 'UT', 1),
+]
+
+GENRES = [name for name, _ in VenueForm.genres.kwargs['choices']]
+
+# genres not listed here weigh 1
+GENRE_WEIGHTS = {
+    'Rock n Roll': 12,
+    'Pop': 10,
+    'Hip-Hop': 9,
+    'Alternative': 8,
+    'Electronic': 7,
+    'Jazz': 6,
+    'R&B': 5,
+    'Country': 5,
+    'Folk': 4,
+    'Punk': 3,
+    'Soul': 3,
+    'Blues': 3,
+    'Heavy Metal': 3,
+}
+
+VENUE_WORDS = (
+    ['Velvet', 'Blue', 'Golden', 'Red', 'Electric', 'Midnight', 'Rusty', 'Silver', 'Copper', 'Wild', 'Crystal', 'Black'],
+    ['Room', 'Lounge', 'Hall', 'Tavern', 'Ballroom', 'Club', 'Theatre', 'Garden', 'Cellar', 'Barn', 'Warehouse', 'Saloon'],
+)
+
+ARTIST_WORDS = (
+    ['Quiet', 'Neon', 'Broken', 'Lazy', 'Paper', 'Savage', 'Lunar', 'Hollow', 'Northern', 'Static', 'Velvet', 'Young'],
+    ['Owls', 'Rivers', 'Ghosts', 'Tigers', 'Echoes', 'Saints', 'Wolves', 'Machines', 'Lovers', 'Kings', 'Sparrows', 'Drifters'],
+)
+
+SEEKING = [
+    'We are on the lookout for a local band to play on weekends.',
+    'Looking for jazz and soul acts for our Thursday nights.',
+    'Booking touring acts for the coming season.',
+]
+
+# weekday() -> weight, Friday and Saturday nights are the busiest
+WEEKDAY_WEIGHTS = [2, 2, 3, 4, 8, 9, 5]
+HOUR_WEIGHTS = {18: 1, 19: 3, 20: 5, 21: 4, 22: 2, 23: 1}
+
+# share of shows in the past and how far back and ahead shows go
+PAST_SHARE = 0.6
+PAST_DAYS = 365
+UPCOMING_DAYS = 180
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def pareto_weights(rng, n, alpha=2.0):
+    # heavy tailed popularity, a few entries get most of the weight
+    return [rng.paretovariate(alpha) for _ in range(n)]
+
+
+class Generator(object):
+    """Synthetic records, generate venues and artists before shows."""
+
+    def __init__(self, seed=0, today=None):
+        self.rng = random.Random(seed)
+        today = today or datetime.date.today()
+        self.today = datetime.datetime.combine(today, datetime.time.min)
+        # base name -> times it was drawn
+        self.names = {}
+        # name -> (state, popularity) of the generated venues and artists
+        self.venue_places = {}
+        self.artist_places = {}
+
+    def unique(self, words):
+        # a number after names drawn before: Blue Room, Blue Room 2...
+        name = '%s %s' % (self.rng.choice(words[0]), self.rng.choice(words[1]))
+        count = self.names[name] = self.names.get(name, 0) + 1
+        return name if count == 1 else '%s %d' % (name, count)
+
+    def place(self):
+        city, state, _ = self.rng.choices(CITIES, weights=[w for _, _, w in CITIES])[0]
+        return city, state
+
+    def genres(self):
+        weights = [GENRE_WEIGHTS.get(g, 1) for g in GENRES]
+        picked = []
+        for _ in range(self.rng.choice([1, 1, 2, 2, 2, 3])):
+            genre = self.rng.choices(GENRES, weights=weights)[0]
+            if genre not in picked:
+                picked.append(genre)
+        return picked
+
+    def phone(self):
+        return '%03d-%03d-%04d' % (self.rng.randint(201, 989), self.rng.randint(200, 999), self.rng.randint(0, 9999))
+
+    def links(self, name):
+        slug = name.lower().replace(' ', '')
+        return {
+            'image_link': 'https://picsum.photos/seed/%s/300/300' % slug,
+            'facebook_link': 'https://www.facebook.com/%s' % slug,
+            'website': 'https://www.%s.com' % slug,
+        }
+
+    def venues(self, n):
+        records = []
+        for popularity in pareto_weights(self.rng, n):
+            name = 'The ' + self.unique(VENUE_WORDS)
+            city, state = self.place()
+            seeking = self.rng.random() < 0.3
+            record = {
+                'name': name,
+                'city': city,
+                'state': state,
+                'address': '%d %s St' % (self.rng.randint(1, 9999), self.rng.choice(VENUE_WORDS[0])),
+                'phone': self.phone(),
+                'genres': self.genres(),
+                'seeking_talent': int(seeking),
+                'seeking_description': self.rng.choice(SEEKING) if seeking else '',
+            }
+            record.update(self.links(name))
+            self.venue_places[name] = (state, popularity)
+            records.append(record)
+        return records
+
+    def artists(self, n):
+        records = []
+        for popularity in pareto_weights(self.rng, n):
+            name = self.unique(ARTIST_WORDS)
+            city, state = self.place()
+            seeking = self.rng.random() < 0.6
+            record = {
+                'name': name,
+                'city': city,
+                'state': state,
+                'phone': self.phone(),
+                'genres': self.genres(),
+                'seeking_venue': int(seeking),
+                'seeking_description': 'Looking for shows in %s and around.' % city if seeking else '',
+            }
+            record.update(self.links(name))
+            if self.rng.random() < 0.2:
+                # a touring window around today
+                start = self.today + datetime.timedelta(days=self.rng.randint(-60, 60))
+                record['available_from_date'] = start.strftime(TIME_FORMAT)
+                record['available_to_date'] = (start + datetime.timedelta(days=self.rng.randint(14, 120))).strftime(TIME_FORMAT)
+            self.artist_places[name] = (state, popularity)
+            records.append(record)
+        return records
+
+    def start_time(self):
+        while True:
+            if self.rng.random() < PAST_SHARE:
+                day = self.today - datetime.timedelta(days=self.rng.randint(1, PAST_DAYS))
+            else:
+                day = self.today + datetime.timedelta(days=self.rng.randint(0, UPCOMING_DAYS))
+            # rejection sampling, keeps the weekday mix whatever the range
+            if self.rng.random() * max(WEEKDAY_WEIGHTS) < WEEKDAY_WEIGHTS[day.weekday()]:
+                break
+        hour = self.rng.choices(list(HOUR_WEIGHTS), weights=list(HOUR_WEIGHTS.values()))[0]
+        return day + datetime.timedelta(hours=hour, minutes=self.rng.choice([0, 30]))
+
+    def shows(self, n, local_share=0.7):
+        venues = sorted(self.venue_places.items())
+        artists = sorted(self.artist_places.items())
+        if not venues or not artists:
+            raise ValueError('generate venues and artists before shows')
+        # cumulative weights, computed once instead of on every draw
+        venue_weights = list(accumulate(popularity for _, (_, popularity) in venues))
+        artist_weights = list(accumulate(popularity for _, (_, popularity) in artists))
+        # artists of every state, for local bookings
+        by_state = {}
+        for index, (_, (state, popularity)) in enumerate(artists):
+            by_state.setdefault(state, ([], []))
+            by_state[state][0].append(index)
+            by_state[state][1].append(popularity)
+        by_state = dict((state, (indexes, list(accumulate(weights))))
+            for state, (indexes, weights) in by_state.items())
+
+        records = []
+        for _ in range(n):
+            venue, (state, _) = self.rng.choices(venues, cum_weights=venue_weights)[0]
+            if state in by_state and self.rng.random() < local_share:
+                indexes, weights = by_state[state]
+                artist = artists[self.rng.choices(indexes, cum_weights=weights)[0]][0]
+            else:
+                artist = self.rng.choices(artists, cum_weights=artist_weights)[0][0]
+            records.append({
+                'venue': venue,
+                'artist': artist,
+                'start_time': self.start_time().strftime(TIME_FORMAT),
+            })
+        return records
@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from config import TestingConfig
+from models import db
+
+
+class Config(TestingConfig):
+    INSTRUMENTATION_LOG = False
+
+
+def make_app(config=Config):
+    app = create_app(config, migrations=False)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed(app, venues=30, artists=60, shows=400):
+    # the data `flask seed` generates, same seed same records
+    result = app.test_cli_runner().invoke(args=[
+        'seed', '--venues', str(venues), '--artists', str(artists), '--shows', str(shows)])
+    assert result.exit_code == 0, result.output
+
+
+@pytest.fixture
+def app():
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seeded(app):
+    seed(app)
+    return app
+
+
+@pytest.fixture
+def queries(app):
+    """Statements sent to the database while the test runs."""
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
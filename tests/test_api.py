@@ -0,0 +1,22 @@
+import base64
+import json
+
+import pytest
+
+
+def cursor(key, id):
+    return base64.urlsafe_b64encode(json.dumps([key, id]).encode('utf-8')).decode('ascii')
+
+
+@pytest.mark.parametrize('value', [
+    'not base64',
+    cursor('not a date', 1),
+    cursor('2020-01-01T00:00:00', 'x'),
+    # dateutil overflows on out of range numbers
+    cursor('99999999999999999999', 1),
+])
+def test_invalid_cursors_are_bad_requests(client, value):
+    response = client.get('/api/v1/venues', query_string={'cursor': value})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'invalid cursor'}
@@ -0,0 +1,101 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Venue, Artist, Show
+from routing import RoutingSession
+
+START = (datetime.datetime.now() + datetime.timedelta(days=30)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def places(app):
+    # two venues and two artists, free every day
+    with app.app_context():
+        for name in ('Hall', 'Club'):
+            db.session.add(Venue(name=name, city='Austin', state='TX', genres='Jazz'))
+        for name in ('Owls', 'Tigers'):
+            db.session.add(Artist(name=name, city='Austin', state='TX', genres='Jazz'))
+        db.session.commit()
+
+
+def book(client, venue_id, artist_id, start_time):
+    return client.post('/shows/create', data={
+        'venue_id': str(venue_id),
+        'artist_id': str(artist_id),
+        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+    }, follow_redirects=True)
+
+
+def shows(app):
+    with app.app_context():
+        return [(s.venue_id, s.artist_id, s.start_time) for s in Show.query.order_by(Show.id)]
+
+
+def test_books_and_counts_a_show(app, client, places):
+    response = book(client, 1, 1, START)
+
+    assert b'Show was successfully listed!' in response.data
+    assert shows(app) == [(1, 1, START)]
+    with app.app_context():
+        assert Venue.query.get(1).upcoming_shows_count == 1
+        assert Artist.query.get(1).upcoming_shows_count == 1
+
+
+@pytest.mark.parametrize('venue_id, artist_id, start_time', [
+    # same venue, another artist, an hour later
+    (1, 2, START + datetime.timedelta(hours=1)),
+    # same artist at another venue, an hour earlier
+    (2, 1, START - datetime.timedelta(hours=1)),
+    # the exact same slot
+    (1, 1, START),
+])
+def test_rejects_overlapping_shows(app, client, places, venue_id, artist_id, start_time):
+    book(client, 1, 1, START)
+
+    response = book(client, venue_id, artist_id, start_time)
+
+    assert b'already has a show booked around' in response.data
+    assert shows(app) == [(1, 1, START)]
+    with app.app_context():
+        # the rolled back booking left the counters alone
+        assert [v.upcoming_shows_count for v in Venue.query.order_by(Venue.id)] == [1, 0]
+        assert [a.upcoming_shows_count for a in Artist.query.order_by(Artist.id)] == [1, 0]
+
+
+def test_books_back_to_back_shows(app, client, places):
+    duration = app.config['SHOW_DURATION']
+    book(client, 1, 1, START)
+
+    response = book(client, 1, 2, START + duration)
+
+    assert b'Show was successfully listed!' in response.data
+    assert len(shows(app)) == 2
+
+
+def test_rejects_unavailable_artist(app, client, places):
+    with app.app_context():
+        artist = Artist.query.get(1)
+        artist.available_from_date = START + datetime.timedelta(days=1)
+        db.session.commit()
+
+    response = book(client, 1, 1, START)
+
+    assert b'not available in this time' in response.data
+    assert shows(app) == []
+
+
+def test_locks_venue_then_artist(app, client, places):
+    # SQLite leaves FOR UPDATE out of the SQL, check the statements instead
+    locked = []
+    def record(state):
+        if state.is_select and state.statement._for_update_arg is not None:
+            locked.append(state.statement.get_final_froms()[0].name)
+    event.listen(RoutingSession, 'do_orm_execute', record)
+    try:
+        book(client, 1, 1, START)
+    finally:
+        event.remove(RoutingSession, 'do_orm_execute', record)
+
+    assert locked == ['venues', 'artists']
@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+
+from app import cache
+from models import db, Venue
+from conftest import Config, make_app
+
+
+@pytest.fixture
+def app():
+    class CacheConfig(Config):
+        CACHE_BACKEND = 'lru'
+    app = make_app(CacheConfig)
+    with app.app_context():
+        db.session.add(Venue(name='Hall', city='Austin', state='TX', genres='Jazz'))
+        db.session.commit()
+    return app
+
+
+def stats(app):
+    with app.test_request_context():
+        stats = cache.stats()
+    return stats['hits'], stats['misses']
+
+
+def test_pages_are_served_from_the_cache(app, client):
+    first = client.get('/venues').data
+
+    assert client.get('/venues').data == first
+    assert stats(app) == (1, 1)
+
+
+def test_pages_miss_once_another_process_changed_their_rows(app, client):
+    client.get('/venues')
+    with app.app_context():
+        # no write view ran in this process, nothing was invalidated
+        db.session.execute(Venue.__table__.insert(), [{'name': 'Club', 'city': 'Austin', 'state': 'TX'}])
+        db.session.commit()
+
+    assert b'Club' in client.get('/venues').data
+    assert stats(app) == (0, 2)
+
+
+def test_commands_changes_are_seen_without_clearing(app, client):
+    client.get('/venues')
+
+    app.test_cli_runner().invoke(args=['seed', '--venues', '5', '--artists', '5', '--shows', '20'])
+
+    assert client.get('/venues').data.count(b'<h5>') == 6
+    assert stats(app) == (0, 2)
+
+
+def test_invalidated_pages_miss(app, client):
+    client.get('/venues')
+    with app.app_context():
+        cache.invalidate('venues')
+
+    client.get('/venues')
+    assert stats(app) == (0, 2)
+
+
+def test_calendar_pages_follow_the_day(app, client, monkeypatch):
+    import app as module
+
+    class Date(datetime.date):
+        today = classmethod(lambda cls: cls(2030, 1, 1))
+    monkeypatch.setattr(module.datetime, 'date', Date)
+    first = client.get('/shows?to=2030-01-20')
+    assert b'Jan 01, 2030' in first.data
+
+    # a day later the omitted from means another range, neither a 304 nor
+    # the cached page may answer with yesterday's
+    Date.today = classmethod(lambda cls: cls(2030, 1, 2))
+    response = client.get('/shows?to=2030-01-20', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert b'Jan 02, 2030' in response.data
+    assert stats(app) == (0, 2)
@@ -0,0 +1,39 @@
+from models import db, Venue
+
+
+def add_venues(app, *names):
+    with app.app_context():
+        for name in names:
+            db.session.add(Venue(name=name, city='Austin', state='TX', genres='Jazz'))
+        db.session.commit()
+
+
+def test_etag_answers_304_until_rows_change(app, client):
+    add_venues(app, 'Hall', 'Club')
+    etag = client.get('/venues').headers['ETag']
+
+    assert client.get('/venues', headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        # a delete leaves max(updated_at) as it was, the row count moves
+        db.session.delete(Venue.query.filter_by(name='Club').one())
+        db.session.commit()
+
+    response = client.get('/venues', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Club' not in response.data
+
+
+def test_no_last_modified(app, client):
+    add_venues(app, 'Hall')
+    response = client.get('/venues')
+
+    assert 'Last-Modified' not in response.headers
+    # If-Modified-Since alone can't get a 304
+    assert client.get('/venues', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}).status_code == 200
+
+
+def test_every_query_string_has_its_own_etag(app, client):
+    add_venues(app, 'Hall')
+
+    assert client.get('/venues').headers['ETag'] != client.get('/venues?state=TX').headers['ETag']
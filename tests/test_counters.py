@@ -0,0 +1,70 @@
+import datetime
+
+import pytest
+
+from models import db, Venue, Artist, Show
+
+NOW = datetime.datetime.now().replace(microsecond=0)
+
+
+@pytest.fixture
+def booked(app):
+    # shows counted as upcoming when they were booked, one of them started
+    # ten minutes ago and one two days ago
+    with app.app_context():
+        db.session.add(Venue(name='Hall', city='Austin', state='TX', genres='Jazz'))
+        db.session.add(Artist(name='Owls', city='Austin', state='TX', genres='Jazz'))
+        db.session.flush()
+        for start_time in (NOW - datetime.timedelta(days=2), NOW - datetime.timedelta(minutes=10), NOW + datetime.timedelta(days=1)):
+            db.session.add(Show(venue_id=1, artist_id=1, start_time=start_time))
+            Show.bump(1, 1, start_time, now=start_time - datetime.timedelta(days=7))
+        db.session.commit()
+
+
+def counts(app):
+    with app.app_context():
+        venue, artist = Venue.query.get(1), Artist.query.get(1)
+        return (venue.upcoming_shows_count, venue.past_shows_count), (artist.upcoming_shows_count, artist.past_shows_count)
+
+
+def test_roll_moves_started_shows_to_past(app, booked):
+    result = app.test_cli_runner().invoke(args=['counters', 'roll'])
+
+    assert result.output.strip() == '1 venues, 1 artists recounted'
+    # a recount, so the show of two days ago, out of the window, moved too
+    assert counts(app) == ((1, 2), (1, 2))
+
+
+def test_roll_is_idempotent(app, booked):
+    runner = app.test_cli_runner()
+    runner.invoke(args=['counters', 'roll'])
+
+    runner.invoke(args=['counters', 'roll'])
+
+    assert counts(app) == ((1, 2), (1, 2))
+
+
+def test_roll_without_started_shows_changes_nothing(app, booked):
+    since = (NOW - datetime.timedelta(minutes=5)).strftime('%Y-%m-%d %H:%M:%S')
+
+    result = app.test_cli_runner().invoke(args=['counters', 'roll', '--since', since])
+
+    assert result.output.strip() == '0 venues, 0 artists recounted'
+    assert counts(app) == ((3, 0), (3, 0))
+
+
+def test_roll_window(app, booked):
+    with app.app_context():
+        venue_ids, artist_ids = Show.roll(NOW - datetime.timedelta(days=3), NOW - datetime.timedelta(days=1))
+        db.session.commit()
+
+    assert (venue_ids, artist_ids) == ({1}, {1})
+    # counted as of the end of the window
+    assert counts(app) == ((2, 1), (2, 1))
+
+
+def test_rebuild_recounts_everything(app, booked):
+    result = app.test_cli_runner().invoke(args=['counters', 'rebuild'])
+
+    assert result.output.strip() == '1 venues, 1 artists recounted'
+    assert counts(app) == ((1, 2), (1, 2))
@@ -0,0 +1,61 @@
+import io
+
+from importer import Importer, read_records
+from models import Venue, Artist, Show, Genre
+
+VENUES = '''name,city,state,address,image_link,facebook_link,genres,website,seeking_talent
+Hall,Austin,TX,1 Main St,https://i.com/1,https://f.com/1,"Jazz,Blues",https://w.com/1,1
+Hall,Austin,TX,2 Main St,https://i.com/2,https://f.com/2,Folk,https://w.com/2,0
+Club,Austin,TX,3 Main St,https://i.com/3,https://f.com/3,Jazz,https://w.com/3,1
+Barn,Dallas,TX,4 Main St,https://i.com/4,https://f.com/4,Blues,https://w.com/4,0
+Cellar,Dallas,TX,,https://i.com/5,https://f.com/5,Jazz,https://w.com/5,0
+'''
+
+
+def run(kind, text, fmt='csv', batch_size=2):
+    return Importer(kind, batch_size).run(read_records(io.StringIO(text), fmt))
+
+
+def genres_by_address(Model=Venue):
+    return dict((v.address, sorted(g.name for g in v.genre_list)) for v in Model.query)
+
+
+def test_imports_in_batches_and_links_genres(app, queries):
+    with app.app_context():
+        result = run('venues', VENUES)
+
+        assert (result.inserted, [n for n, _ in result.rejected]) == (4, [5])
+        # duplicate names keep their own genres
+        assert genres_by_address() == {
+            '1 Main St': ['Blues', 'Jazz'],
+            '2 Main St': ['Folk'],
+            '3 Main St': ['Jazz'],
+            '4 Main St': ['Blues'],
+        }
+    # one executemany per batch of two, no INSERT per row
+    assert len([q for q in queries if q.startswith('INSERT INTO venues')]) == 2
+
+
+def test_second_run_links_its_own_rows(app):
+    with app.app_context():
+        run('venues', VENUES)
+        run('venues', VENUES.replace('Main St', 'Side St'))
+
+        assert Venue.query.count() == 8
+        assert genres_by_address()['2 Side St'] == ['Folk']
+        assert Genre.query.count() == 3
+
+
+def test_shows_reference_venues_and_artists_by_name(app):
+    with app.app_context():
+        run('venues', VENUES)
+        run('artists', '{"name": "Owls", "city": "Austin", "state": "TX", "genres": ["Jazz"], '
+            '"image_link": "https://i.com", "facebook_link": "https://f.com", "website": "https://w.com", "seeking_venue": 1}\n', 'jsonl')
+        result = run('shows', 'venue,artist,start_time\n'
+            'Club,Owls,2030-01-01 20:00:00\n'
+            'Nowhere,Owls,2030-01-02 20:00:00\n')
+
+        assert result.inserted == 1
+        assert result.rejected[0][1] == {'venue_id': ['Unknown or missing reference.']}
+        show = Show.query.one()
+        assert (show.venue_id, show.artist_id) == (Venue.query.filter_by(name='Club').one().id, Artist.query.one().id)
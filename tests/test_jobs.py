@@ -0,0 +1,128 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from app import jobs
+from models import db, Job
+from conftest import Config, make_app
+
+
+class Recorder(object):
+
+    def __init__(self):
+        # key -> threads of the calls so far, and the keys in call order
+        self.calls = {}
+        self.order = []
+
+    def call(self, key, fails):
+        self.calls.setdefault(key, []).append(threading.current_thread().name)
+        self.order.append(key)
+        if len(self.calls[key]) <= fails:
+            raise RuntimeError('attempt %d of %s failed' % (len(self.calls[key]), key))
+
+
+# the recorder of the running test, see the fixture
+recorder = None
+
+
+@pytest.fixture(autouse=True)
+def recorded(monkeypatch):
+    # a fresh one for every test, results don't depend on the test order
+    monkeypatch.setattr(sys.modules[__name__], 'recorder', Recorder())
+    return recorder
+
+
+def call(key, fails):
+    recorder.call(key, fails)
+
+
+@jobs.task('test.durable')
+def durable(key, fails=0):
+    call(key, fails)
+
+
+@jobs.task('test.local', local=True)
+def local(key, fails=0):
+    call(key, fails)
+
+
+def enqueue_view(name, commit=True, **kwargs):
+    def view():
+        jobs.enqueue(name, **kwargs)
+        if commit:
+            db.session.commit()
+        else:
+            db.session.rollback()
+        return ''
+    return view
+
+
+def job_rows(app):
+    with app.app_context():
+        return [(job.name, job.status, job.attempts) for job in Job.query.order_by(Job.id)]
+
+
+def test_durable_job_runs_after_the_request(app, recorded):
+    app.add_url_rule('/write', 'write', enqueue_view('test.durable', key='after request'))
+
+    app.test_client().get('/write')
+
+    assert len(recorded.calls['after request']) == 1
+    # done jobs are deleted
+    assert job_rows(app) == []
+
+
+def test_durable_job_of_a_rolled_back_request_never_runs(app, recorded):
+    app.add_url_rule('/write', 'write', enqueue_view('test.durable', commit=False, key='rolled back'))
+
+    app.test_client().get('/write')
+
+    assert 'rolled back' not in recorded.calls
+    assert job_rows(app) == []
+
+
+def test_failing_durable_job_is_retried_then_failed(app, recorded):
+    app.add_url_rule('/write', 'write', enqueue_view('test.durable', key='always fails', fails=99))
+
+    app.test_client().get('/write')
+
+    attempts = app.config['JOBS_MAX_ATTEMPTS']
+    assert len(recorded.calls['always fails']) == attempts
+    assert job_rows(app) == [('test.durable', 'failed', attempts)]
+
+
+def test_worker_runs_jobs_enqueued_outside_requests(app, recorded):
+    with app.app_context():
+        jobs.enqueue('test.durable', key='from a command')
+        db.session.commit()
+    assert job_rows(app) == [('test.durable', 'queued', 0)]
+
+    result = app.test_cli_runner().invoke(args=['jobs', 'work', '--once'])
+
+    assert result.output.strip() == '1 jobs done'
+    assert len(recorded.calls['from a command']) == 1
+    assert job_rows(app) == []
+
+
+def test_local_retries_wait_on_a_timer(recorded):
+    class PooledConfig(Config):
+        JOBS_EAGER = False
+        JOBS_WORKERS = 1
+        JOBS_RETRY_DELAY = 0.2
+    app = make_app(PooledConfig)
+    def view():
+        jobs.enqueue('test.local', key='flaky local', fails=1)
+        jobs.enqueue('test.local', key='next local')
+        return ''
+    app.add_url_rule('/write', 'write', view)
+
+    app.test_client().get('/write')
+    deadline = time.time() + 5
+    while len(recorded.calls.get('flaky local', [])) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+
+    # the only thread of the pool ran the next job during the backoff
+    assert recorded.order == ['flaky local', 'next local', 'flaky local']
+    assert all(thread.startswith('jobs') for thread in recorded.calls['flaky local'])
@@ -0,0 +1,64 @@
+import logging
+
+import pytest
+
+from models import db, Venue
+from nplusone import NPlusOneError, shape
+from conftest import Config, make_app
+
+
+def venue_names(count):
+    # one query per venue, the N+1 pattern the detector looks for
+    def view():
+        return ','.join(db.session.query(Venue.name).filter(Venue.id == id).scalar() or '' for id in range(1, count + 1))
+    return view
+
+
+def with_views(app):
+    threshold = app.config['NPLUSONE_THRESHOLD']
+    app.add_url_rule('/below', 'below', venue_names(threshold))
+    app.add_url_rule('/above', 'above', venue_names(threshold + 1))
+    return app
+
+
+def test_shape_ignores_arguments():
+    assert shape("SELECT * FROM venues WHERE id = 3 AND name = 'Hall'") == \
+        shape('SELECT * FROM venues WHERE id = ? AND name = ?')
+    assert shape('SELECT * FROM venues WHERE id IN (?, ?, ?)') == shape('SELECT * FROM venues WHERE id IN (?)')
+
+
+def test_raises_under_tests(app):
+    client = with_views(app).test_client()
+
+    with pytest.raises(NPlusOneError) as error:
+        client.get('/above')
+
+    assert '11 x SELECT venues.name AS venues_name FROM venues WHERE venues.id = ?' in str(error.value)
+    # pointing at the loop that runs it
+    assert 'tests/test_nplusone.py' in str(error.value)
+
+
+def test_threshold_runs_are_fine(app):
+    response = with_views(app).test_client().get('/below')
+
+    assert response.status_code == 200
+
+
+def test_warns_without_raising(caplog):
+    class WarnConfig(Config):
+        NPLUSONE_RAISE = False
+    client = with_views(make_app(WarnConfig)).test_client()
+
+    with caplog.at_level(logging.WARNING):
+        response = client.get('/above')
+
+    assert response.status_code == 200
+    assert 'N+1 query, run more than 10 times in one request' in caplog.text
+
+
+def test_off_unless_enabled():
+    class ProductionLikeConfig(Config):
+        NPLUSONE_ENABLED = False
+    response = with_views(make_app(ProductionLikeConfig)).test_client().get('/above')
+
+    assert response.status_code == 200
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import create_engine, exc
+
+from config import engine_options
+from instrumentation import TimedQueuePool
+from conftest import Config, make_app
+
+
+def test_sqlite_keeps_its_own_pool():
+    assert engine_options('sqlite:////tmp/fyyur.db') == {}
+
+
+def test_engine_options_from_the_environment(monkeypatch):
+    url = 'postgresql://localhost/fyyur'
+    assert engine_options(url, pool_size=4, max_overflow=2) == {
+        'pool_size': 4,
+        'max_overflow': 2,
+        'pool_timeout': 30.0,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    }
+
+    monkeypatch.setenv('DB_POOL_SIZE', '8')
+    monkeypatch.setenv('DB_POOL_PRE_PING', '0')
+    options = engine_options(url, pool_size=4)
+    assert (options['pool_size'], options['pool_pre_ping']) == (8, False)
+
+
+def test_timed_pool_counts_checkouts_and_timeouts(tmp_path):
+    engine = create_engine('sqlite:///%s' % (tmp_path / 'pool.db'),
+        poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05)
+    pool = engine.pool
+
+    conn = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    conn.close()
+
+    assert pool.checkout_wait.count == 2
+    assert pool.timeouts == 1
+    assert pool.opened == 1
+    pool.dispose()
+    assert pool.closed == 1
+
+
+@pytest.fixture
+def pooled(tmp_path):
+    class PoolConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///%s' % (tmp_path / 'fyyur.db')
+        SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 2, 'max_overflow': 0}
+    return make_app(PoolConfig)
+
+
+def test_metrics_report_the_pool(pooled):
+    client = pooled.test_client()
+    client.get('/venues')
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+
+    assert 'fyyur_db_pool_size 2' in metrics
+    # the /metrics request itself holds no connection
+    assert 'fyyur_db_pool_checked_out 0' in metrics
+    assert 'fyyur_db_pool_timeouts_total 0' in metrics
+    assert 'fyyur_db_pool_checkout_seconds_count{pool="default"}' in metrics
+
+
+def test_server_timing_reports_the_checkout_wait(pooled):
+    response = pooled.test_client().get('/venues')
+
+    assert 'pool;dur=' in response.headers['Server-Timing']
@@ -0,0 +1,54 @@
+import datetime
+
+import pytest
+
+#----------------------------------------------------------------------------#
+# Statements per request of every page, on seeded data. Each count is fixed
+# whatever the number of rows: a page that starts querying per row fails
+# here (and trips the N+1 detector). Every request runs twice and only the
+# second one is counted, the first builds the in-memory search indexes.
+#----------------------------------------------------------------------------#
+
+TODAY = datetime.date.today()
+
+ROUTES = [
+    ('GET', '/', 3),
+    ('GET', '/venues', 3),
+    ('GET', '/venues?state=CA', 3),
+    ('GET', '/venues?sort=popular', 3),
+    ('GET', '/venues/1', 5),
+    ('GET', '/venues/1/edit', 1),
+    ('GET', '/venues/create', 0),
+    ('GET', '/artists', 2),
+    ('GET', '/artists?sort=popular', 2),
+    ('GET', '/artists/1', 3),
+    ('GET', '/artists/1/edit', 1),
+    ('GET', '/artists/create', 0),
+    ('GET', '/shows', 2),
+    ('GET', '/shows?from=%s&to=%s' % (TODAY, TODAY + datetime.timedelta(days=7)), 2),
+    ('GET', '/shows/create', 0),
+    ('GET', '/autocomplete?q=the', 0),
+    ('POST', '/venues/search', 1),
+    ('POST', '/artists/search', 1),
+    ('GET', '/export/venues.csv', 1),
+    ('GET', '/export/shows.jsonl', 1),
+    ('GET', '/api/v1/venues', 1),
+    ('GET', '/api/v1/venues/1/recommendations', 2),
+    ('GET', '/api/v1/artists', 1),
+    ('GET', '/api/v1/shows', 1),
+]
+
+
+@pytest.mark.parametrize('method, path, expected', ROUTES)
+def test_statements_per_request(seeded, queries, method, path, expected):
+    client = seeded.test_client()
+    data = {'search_term': 'the'} if method == 'POST' else None
+    client.open(path, method=method, data=data).get_data()
+    del queries[:]
+
+    response = client.open(path, method=method, data=data)
+    # streamed pages query while the body is read
+    response.get_data()
+
+    assert response.status_code == 200
+    assert len(queries) == expected, queries
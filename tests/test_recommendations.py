@@ -0,0 +1,82 @@
+import datetime
+
+import pytest
+
+import recommendations
+from models import db, Venue, Artist, Recommendation
+
+NOW = datetime.datetime.now()
+DAY = datetime.timedelta(days=1)
+
+
+def add_artist(name, genres, city='Austin', state='TX', seeking=True, **fields):
+    artist = Artist(name=name, city=city, state=state, seeking_venue=seeking, **fields)
+    artist.setGenres(genres)
+    db.session.add(artist)
+    return artist
+
+
+@pytest.fixture
+def catalog(app):
+    with app.app_context():
+        venue = Venue(name='Hall', city='Austin', state='TX', seeking_talent=True)
+        venue.setGenres(['Jazz', 'Blues'])
+        db.session.add(venue)
+        # half the genres, same city, available
+        add_artist('Owls', ['Jazz'])
+        # every genre, same state
+        add_artist('Tigers', ['Jazz', 'Blues'], city='Dallas')
+        # available from tomorrow, another state
+        add_artist('Ghosts', ['Blues'], city='New York', state='NY', available_from_date=NOW + DAY)
+        # no genre in common, not seeking, no longer available
+        add_artist('Saints', ['Rock n Roll'])
+        add_artist('Wolves', ['Jazz'], seeking=False)
+        add_artist('Kings', ['Jazz'], available_to_date=NOW - DAY)
+        db.session.commit()
+
+
+def matches(venue_id=1):
+    return [(row.name, row.score) for row in Recommendation.forVenue(venue_id, 10)]
+
+
+def test_rebuild_scores_matching_artists(app, catalog):
+    with app.app_context():
+        assert recommendations.rebuild() == 3
+        db.session.commit()
+
+        assert matches() == [('Tigers', 0.85), ('Owls', 0.7), ('Ghosts', 0.35)]
+
+
+def test_venues_not_seeking_talent_get_none(app, catalog):
+    with app.app_context():
+        Venue.query.get(1).seeking_talent = False
+        recommendations.rebuild()
+        db.session.commit()
+
+        assert matches() == []
+
+
+def test_refresh_artist_returns_changed_venues(app, catalog):
+    with app.app_context():
+        recommendations.rebuild()
+        artist = Artist.query.filter_by(name='Owls').one()
+        artist.setGenres(['Rock n Roll'])
+        db.session.flush()
+
+        assert recommendations.refresh_artist(artist.id) == {1}
+        db.session.commit()
+        assert [name for name, _ in matches()] == ['Tigers', 'Ghosts']
+
+
+def test_venue_page_shows_matches_after_edit(app, client, catalog):
+    # the edit enqueues recommendations.venue, JOBS_EAGER runs it right away
+    client.post('/venues/1/edit', data={
+        'name': 'Hall', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+        'phone': '555-555-5555', 'image_link': 'https://picsum.photos/300',
+        'facebook_link': 'https://www.facebook.com/hall', 'website': 'https://www.hall.com',
+        'genres': ['Jazz'], 'seeking_talent': '1', 'seeking_description': 'Bands.',
+    })
+
+    page = client.get('/venues/1').get_data(as_text=True)
+    assert 'Owls' in page and 'Tigers' in page
+    assert 'Ghosts' not in page
@@ -0,0 +1,103 @@
+import shutil
+
+import pytest
+
+from models import db, Venue
+from conftest import Config, make_app
+
+VENUE = {
+    'name': 'Hall',
+    'city': 'Austin',
+    'state': 'TX',
+    'address': '1 Main St',
+    'phone': '555-555-5555',
+    'image_link': 'https://picsum.photos/300',
+    'facebook_link': 'https://www.facebook.com/hall',
+    'website': 'https://www.hall.com',
+    'genres': ['Jazz'],
+    'seeking_talent': '1',
+    'seeking_description': 'Looking for bands.',
+}
+
+
+@pytest.fixture
+def app(tmp_path):
+    # the replica is a copy of the primary taken before the test writes,
+    # so it lags behind every write that follows
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    class ReplicaConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///%s' % primary
+        SQLALCHEMY_REPLICA_URIS = ['sqlite:///%s' % replica]
+        CACHE_BACKEND = 'lru'
+        REPLICA_LAG_TOLERANCE = 60
+    app = make_app(ReplicaConfig)
+    with app.app_context():
+        db.session.add(Venue(name='Hall', city='Austin', state='TX', genres='Jazz'))
+        db.session.commit()
+        db.get_engine(app).dispose()
+    shutil.copy(str(primary), str(replica))
+    return app
+
+
+def rename(client, name):
+    # following the redirect shows the flash message, later pages are cacheable
+    return client.post('/venues/1/edit', data=dict(VENUE, name=name), follow_redirects=True)
+
+
+def test_reads_go_to_the_replica(app):
+    with app.app_context():
+        Venue.query.get(1).name = 'Primary Hall'
+        db.session.commit()
+
+    response = app.test_client().get('/venues/1')
+
+    assert b'Primary Hall' not in response.data
+
+
+def test_writer_reads_its_writes(app):
+    client = app.test_client()
+    rename(client, 'New Hall')
+
+    assert b'New Hall' in client.get('/venues/1').data
+    # other browsers read the lagging replica
+    assert b'New Hall' not in app.test_client().get('/venues/1').data
+
+
+def test_writer_skips_pages_cached_from_the_replica(app):
+    writer, reader = app.test_client(), app.test_client()
+    writer.get('/venues/1')
+    rename(writer, 'New Hall')
+
+    # another browser renders the page from the replica, the cache keeps it
+    assert b'New Hall' not in reader.get('/venues/1').data
+    assert b'New Hall' not in reader.get('/venues/1').data
+
+    assert b'New Hall' in writer.get('/venues/1').data
+
+
+def test_searches_do_not_pin_reads_to_the_primary(app):
+    client = app.test_client()
+    client.post('/venues/search', data={'search_term': 'hall'})
+
+    with client.session_transaction() as session:
+        assert 'wrote_at' not in session
+
+
+def test_only_committed_flushes_are_writes(app):
+    with app.test_request_context('/venues/create', method='POST'):
+        db.session.add(Venue(name='Club', city='Austin', state='TX', genres='Jazz'))
+        db.session.flush()
+        db.session.rollback()
+        assert not db.session().wrote
+
+        db.session.add(Venue(name='Club', city='Austin', state='TX', genres='Jazz'))
+        db.session.commit()
+        assert db.session().wrote
+
+
+def test_committed_writes_pin_reads_to_the_primary(app):
+    client = app.test_client()
+    rename(client, 'New Hall')
+
+    with client.session_transaction() as session:
+        assert 'wrote_at' in session
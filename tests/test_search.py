@@ -0,0 +1,149 @@
+import threading
+
+import pytest
+
+from app import search
+from models import db, Venue
+from search import TrigramIndex, PrefixIndex
+from conftest import Config, make_app
+
+
+def test_trigram_index_matches_substrings_and_locations():
+    index = TrigramIndex()
+    index.add(1, 'The Musical Hop', 'San Francisco', 'CA')
+    index.add(2, 'Park Square Live Music', 'New York', 'NY')
+
+    assert index.search('music', 10) == (2, [(1, 'The Musical Hop'), (2, 'Park Square Live Music')])
+    assert index.search('San Francisco, CA', 10) == (1, [(1, 'The Musical Hop')])
+
+    index.remove(1)
+    assert index.search('music', 10) == (1, [(2, 'Park Square Live Music')])
+
+
+def test_trigram_index_is_thread_safe():
+    index = TrigramIndex()
+    errors = []
+    def writer(offset):
+        try:
+            for id in range(offset, offset + 200):
+                index.add(id, 'Venue %d' % id, 'Austin', 'TX')
+                if id % 2:
+                    index.remove(id)
+        except Exception as e:
+            errors.append(e)
+    def reader():
+        try:
+            for _ in range(20):
+                index.search('venue', 10)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=writer, args=(i * 1000,)) for i in range(4)]
+    threads += [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert index.search('venue', 10)[0] == 400
+
+
+def test_prefix_index_completes_names_and_places():
+    index = PrefixIndex()
+    index.add('venue', 1, 'The Musical Hop', 'San Francisco', 'CA')
+    index.add('artist', 1, 'Guns N Petals', 'San Francisco', 'CA')
+
+    assert [r['name'] for r in index.complete('the m')] == ['The Musical Hop']
+    assert [(r['type'], r['id']) for r in index.complete('san f')] == [('artist', 1), ('venue', 1)]
+
+
+@pytest.fixture
+def app():
+    class SearchConfig(Config):
+        SEARCH_CHECK_INTERVAL = 60
+    app = make_app(SearchConfig)
+    with app.app_context():
+        db.session.add(Venue(name='The Musical Hop', city='San Francisco', state='CA', genres='Jazz'))
+        db.session.commit()
+    return app
+
+
+def insert_elsewhere(app, name):
+    # a row written the way another process would, without this process'
+    # write views updating its indexes
+    with app.app_context():
+        db.session.execute(Venue.__table__.insert(), [{'name': name, 'city': 'Austin', 'state': 'TX'}])
+        db.session.commit()
+
+
+def names(client, prefix):
+    return [r['name'] for r in client.get('/autocomplete?q=' + prefix).get_json()['results']]
+
+
+def test_indexes_are_built_after_the_first_lookup(app, client):
+    assert app.extensions['search']['autocomplete'] is None
+
+    # answered from memory, the build runs after the response
+    assert names(client, 'the') == []
+    assert names(client, 'the') == ['The Musical Hop']
+
+
+def test_lookups_never_query_the_database(app, queries):
+    with app.app_context():
+        search.refresh()
+        app.extensions['search']['checked'] = 0
+        del queries[:]
+
+        assert [r['name'] for r in search.complete('the')] == ['The Musical Hop']
+
+    assert queries == []
+
+
+def test_indexes_follow_other_processes_after_the_check_interval(app, client):
+    with app.app_context():
+        search.refresh()
+    insert_elsewhere(app, 'The Other Place')
+
+    # checked at most every SEARCH_CHECK_INTERVAL seconds
+    assert names(client, 'the') == ['The Musical Hop']
+
+    # due: this lookup schedules the refresh, the next one sees its result
+    app.extensions['search']['checked'] = 0
+    assert names(client, 'the') == ['The Musical Hop']
+    assert names(client, 'the') == ['The Musical Hop', 'The Other Place']
+    response = client.post('/venues/search', data={'search_term': 'other'})
+    assert b'The Other Place' in response.data
+
+
+def test_writes_of_this_process_show_up_right_away(app, client):
+    with app.app_context():
+        search.refresh()
+    index = app.extensions['search']['autocomplete']
+
+    response = client.post('/venues/create', data={
+        'name': 'The Third Room', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+        'phone': '512-555-0100', 'genres': 'Jazz', 'facebook_link': 'https://facebook.com/third',
+        'website': 'https://third.example', 'image_link': 'https://third.example/room.png',
+        'seeking_talent': 0, 'seeking_description': '',
+    })
+    assert response.status_code == 302
+    assert names(client, 'the') == ['The Musical Hop', 'The Third Room']
+
+    # the indexes already have the write, the next check doesn't rebuild them
+    with app.app_context():
+        app.extensions['search']['checked'] = 0
+        search.refresh()
+    assert app.extensions['search']['autocomplete'] is index
+
+
+def test_refresh_skips_unchanged_tables(app, queries):
+    with app.app_context():
+        search.refresh()
+        index = app.extensions['search']['autocomplete']
+        del queries[:]
+
+        search.refresh()
+
+    # the fingerprint only, nothing rebuilt
+    assert len(queries) == 1
+    assert app.extensions['search']['autocomplete'] is index
@@ -0,0 +1,58 @@
+import datetime
+
+import pytest
+
+from models import db, Venue, Artist, Show
+from synthetic import Generator, PAST_DAYS, UPCOMING_DAYS, HOUR_WEIGHTS, TIME_FORMAT
+
+TODAY = datetime.date(2024, 6, 1)
+
+
+def generate(seed=0, today=TODAY, venues=50, artists=100, shows=500):
+    generator = Generator(seed, today)
+    return generator.venues(venues), generator.artists(artists), generator.shows(shows)
+
+
+def test_same_seed_and_day_same_records():
+    assert generate() == generate()
+
+
+def test_other_seed_or_day_other_records():
+    assert generate(seed=1) != generate()
+    assert generate(today=TODAY + datetime.timedelta(days=1))[2] != generate()[2]
+
+
+def test_names_are_unique():
+    venues, artists, _ = generate(venues=500, artists=1000)
+
+    assert len(set(v['name'] for v in venues)) == 500
+    assert len(set(a['name'] for a in artists)) == 1000
+
+
+def test_shows_reference_generated_records():
+    venues, artists, shows = generate()
+    venue_names, artist_names = set(v['name'] for v in venues), set(a['name'] for a in artists)
+    start = datetime.datetime.combine(TODAY, datetime.time.min)
+
+    for show in shows:
+        assert show['venue'] in venue_names and show['artist'] in artist_names
+        start_time = datetime.datetime.strptime(show['start_time'], TIME_FORMAT)
+        assert start - datetime.timedelta(days=PAST_DAYS) <= start_time
+        assert start_time < start + datetime.timedelta(days=UPCOMING_DAYS + 1)
+        assert start_time.hour in HOUR_WEIGHTS
+
+
+def test_shows_need_venues_and_artists():
+    with pytest.raises(ValueError):
+        Generator().shows(10)
+
+
+def test_seed_command_imports_everything(app):
+    result = app.test_cli_runner().invoke(args=[
+        'seed', '--venues', '20', '--artists', '40', '--shows', '300', '--today', '2024-06-01'])
+
+    assert 'rejected' not in result.output
+    with app.app_context():
+        assert (Venue.query.count(), Artist.query.count(), Show.query.count()) == (20, 40, 300)
+        # counters are recounted after the bulk insert
+        assert db.session.query(db.func.sum(Venue.upcoming_shows_count + Venue.past_shows_count)).scalar() == 300
@@ -0,0 +1,40 @@
+import os
+
+#----------------------------------------------------------------------------#
+# Production entry point.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Loads config.ProductionConfig unless FYYUR_CONFIG says otherwise. With
+# preload_app the master imports this module once, so the application, its
+# compiled templates and its search indexes are shared by every forked
+# worker.
+#----------------------------------------------------------------------------#
+
+os.environ.setdefault('FYYUR_CONFIG', 'config.ProductionConfig')
+
+from app import create_app, search
+
+# alembic is only needed by `flask db`, not by the server
+app = create_app(migrations=False)
+
+
+def warm_templates(app):
+    # compile every template into the Jinja cache now instead of on the
+    # first request of every worker
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+
+if not app.config['SECRET_KEY']:
+    raise RuntimeError('SECRET_KEY must be set, workers have to share it to read each other\'s sessions')
+
+warm_templates(app)
+
+# the search indexes too, forked workers start with a copy of them; with
+# the database out of reach they are built by the first lookup's refresh
+with app.app_context():
+    try:
+        search.refresh()
+    except Exception as e:
+        app.logger.warning('search indexes not built at startup: %s', e)